@@ -0,0 +1,280 @@
+"""基础音频缓存：以 (后端, 接口地址, 模型, 音色, 输入文本, 语速, 增益) 的哈希为键保存合成结果。
+
+同一进程内对相同键的并发请求只会触发一次合成（single-flight），其余请求等待同一结果。
+
+共享模式（shared=True）下多个进程可使用同一缓存目录：
+- 合成结果先写入临时文件再 os.replace 原子发布，读者不会看到写了一半的音频
+- 以 locks/<键>.lock 上的 flock 咨询锁实现跨进程 single-flight，拿到锁后先复查是否已被其他实例合成
+- 目录本身即共享索引：本地索引未命中时直接查看文件是否存在，文件 mtime 作为全局最近使用顺序，
+  淘汰时重新扫描目录并持 locks/evict.lock 由一个实例统一删除
+"""
+from collections import OrderedDict
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows 无 fcntl，共享模式退化为仅进程内 single-flight（原子发布仍然有效）
+    fcntl = None
+
+HAS_FILE_LOCK = fcntl is not None
+
+# 共享模式下临时文件超过该秒数未更新才视为崩溃遗留，避免误删其他实例正在写入的文件
+_STALE_TMP_SECONDS = 600
+# 等待其他实例释放锁时的轮询间隔（秒），指数增长到上限
+_LOCK_POLL_INTERVAL = 0.05
+_LOCK_POLL_MAX_INTERVAL = 0.5
+
+
+class _ProducerCancelled(Exception):
+    """合成方被取消，通知同键的等待方重新尝试。"""
+
+
+class AudioCache:
+    def __init__(self, cache_dir, max_entries: int = 200, shared: bool = False):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = int(max_entries)
+        self.shared = bool(shared)
+        self._lock_dir = self.cache_dir / "locks"
+        self._index = OrderedDict()  # key -> 文件大小，按最近使用排序
+        self._inflight = {}  # key -> asyncio.Future
+        # 共享模式下每发布若干条重新扫描一次目录，感知其他实例写入的文件
+        self._rescan_interval = max(1, self.max_entries // 10)
+        self._published_since_scan = 0
+        self._evict_task = None
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0  # 命中其他实例合成的文件
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(backend: str, api_url: str, model: str, voice: str, text: str, speed: float, gain: float) -> str:
+        payload = json.dumps(
+            [backend or '', api_url or '', model or '', voice or '', text, round(float(speed), 4), round(float(gain), 4)],
+            ensure_ascii=False,
+        )
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.wav"
+
+    def load_index(self) -> None:
+        """扫描缓存目录重建索引，顺带清理残留的临时文件。"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if self.shared:
+            self._lock_dir.mkdir(exist_ok=True)
+            self._evict_shared()
+            return
+        self._index = OrderedDict((key, size) for _, key, size in self._scan())
+        self._evict()
+
+    def _scan(self) -> list:
+        """返回目录中的缓存文件 [(mtime, key, size), ...]，按 mtime 升序；同时删除残留临时文件。"""
+        now = time.time()
+        entries = []
+        for p in self.cache_dir.iterdir():
+            try:
+                if p.suffix == '.tmp':
+                    if not self.shared or now - p.stat().st_mtime > _STALE_TMP_SECONDS:
+                        p.unlink()
+                elif p.suffix == '.wav':
+                    st = p.stat()
+                    entries.append((st.st_mtime, p.stem, st.st_size))
+            except Exception:
+                pass
+        entries.sort()
+        return entries
+
+    def get(self, key: str):
+        """命中则返回缓存文件路径并刷新其最近使用顺序，否则返回 None。"""
+        path = self._path_for(key)
+        if key in self._index:
+            if not path.exists():
+                self._index.pop(key, None)
+                return None
+        elif self.shared:
+            # 本地索引没有时查看共享目录，可能是其他实例刚合成的
+            try:
+                self._index[key] = path.stat().st_size
+            except OSError:
+                return None
+            self.shared_hits += 1
+        else:
+            return None
+        self._index.move_to_end(key)
+        try:
+            os.utime(path)
+        except Exception:
+            pass
+        return path
+
+    def _evict(self) -> None:
+        if self.shared:
+            self._published_since_scan += 1
+            if len(self._index) > self.max_entries or self._published_since_scan >= self._rescan_interval:
+                # 扫描共享目录放到线程中执行，不阻塞事件循环；同一时刻只保留一个扫描任务
+                if self._evict_task is None or self._evict_task.done():
+                    self._published_since_scan = 0
+                    self._evict_task = asyncio.get_running_loop().create_task(self._evict_shared_async())
+            return
+        while self.max_entries > 0 and len(self._index) > self.max_entries:
+            key, _ = self._index.popitem(last=False)
+            try:
+                self._path_for(key).unlink()
+            except Exception:
+                pass
+
+    def _evict_shared(self) -> None:
+        """共享模式：重新扫描目录淘汰超限文件，并以扫描结果重建本地索引（同步，需在线程中调用）。"""
+        self._published_since_scan = 0
+        self._index = OrderedDict((key, size) for _, key, size in self._prune_shared())
+
+    async def _evict_shared_async(self) -> None:
+        try:
+            entries = await asyncio.to_thread(self._prune_shared)
+        except Exception:
+            return
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+
+    def _prune_shared(self) -> list:
+        """按 mtime 淘汰共享目录中超出上限的最旧文件，返回剩余条目；不修改本地索引，可在线程中执行。"""
+        entries = self._scan()
+        excess = len(entries) - self.max_entries
+        if excess > 0:
+            # 其他实例正在淘汰时跳过，由它完成
+            fd = self._try_lock(self._lock_dir / "evict.lock")
+            if fd is not None or not HAS_FILE_LOCK:
+                try:
+                    for _, key, _ in entries[:excess]:
+                        try:
+                            self._path_for(key).unlink()
+                        except Exception:
+                            pass
+                    entries = entries[excess:]
+                finally:
+                    if fd is not None:
+                        os.close(fd)
+        return entries
+
+    @staticmethod
+    def _try_lock(lock_path):
+        """非阻塞地获取 lock_path 上的排他 flock，成功返回文件描述符，锁被占用或不支持时返回 None。"""
+        if not HAS_FILE_LOCK:
+            return None
+        try:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError:
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # 上一个持有者释放前会删除锁文件；若拿到的是已删除的旧文件，锁无效，需重新打开
+            if os.fstat(fd).st_ino != os.stat(lock_path).st_ino:
+                raise FileNotFoundError(lock_path)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    async def _acquire_key_lock(self, key: str):
+        """等待并获取键的跨进程锁，返回文件描述符；不支持文件锁时返回 None。"""
+        if not HAS_FILE_LOCK:
+            return None
+        lock_path = self._lock_dir / f"{key}.lock"
+        delay = _LOCK_POLL_INTERVAL
+        while True:
+            fd = self._try_lock(lock_path)
+            if fd is not None:
+                return fd
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _LOCK_POLL_MAX_INTERVAL)
+
+    def _release_key_lock(self, key: str, fd) -> None:
+        # 先删除再关闭，等待者发现 inode 变化后会重新打开新文件
+        try:
+            (self._lock_dir / f"{key}.lock").unlink()
+        except Exception:
+            pass
+        os.close(fd)
+
+    async def get_or_create(self, key: str, producer):
+        """返回键对应的缓存文件；未命中时调用 producer(tmp_path) 生成。
+
+        producer 是协程函数，负责把音频写入给定的临时路径。
+        合成方被取消时，同键的等待方不会随之被取消，而是由其中一个接手重新合成。
+        """
+        while True:
+            path = self.get(key)
+            if path is not None:
+                self.hits += 1
+                return path
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            try:
+                return await asyncio.shield(inflight)
+            except _ProducerCancelled:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        tmp_path = self.cache_dir / f"{key}.{uuid.uuid4().hex[:8]}.tmp"
+        lock_fd = None
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            if self.shared:
+                self._lock_dir.mkdir(exist_ok=True)
+                lock_fd = await self._acquire_key_lock(key)
+                # 等锁期间其他实例可能已经合成完成
+                path = self.get(key)
+                if path is not None:
+                    self.hits += 1
+                    future.set_result(path)
+                    return path
+            self.misses += 1
+            await producer(tmp_path)
+            final_path = self._path_for(key)
+            os.replace(tmp_path, final_path)
+            self._index[key] = final_path.stat().st_size
+            self._index.move_to_end(key)
+            self._evict()
+            future.set_result(final_path)
+            return final_path
+        except asyncio.CancelledError:
+            # 只取消合成方自身；等待方收到 _ProducerCancelled 后重新进入循环
+            future.set_exception(_ProducerCancelled())
+            future.exception()
+            self._cleanup_tmp(tmp_path)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 避免无人等待时出现 "exception was never retrieved" 警告
+            future.exception()
+            self._cleanup_tmp(tmp_path)
+            raise
+        finally:
+            if lock_fd is not None:
+                self._release_key_lock(key, lock_fd)
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _cleanup_tmp(tmp_path) -> None:
+        try:
+            Path(tmp_path).unlink()
+        except Exception:
+            pass
+
+    def stats_text(self) -> str:
+        if not self.enabled:
+            return "关闭"
+        text = f"{len(self._index)}/{self.max_entries} 条，命中 {self.hits} / 未命中 {self.misses}"
+        if self.shared:
+            text += f"，共享目录 {self.cache_dir}（其他实例合成命中 {self.shared_hits}）"
+        return text
@@ -0,0 +1,198 @@
+"""本地音频后处理：基于 NumPy 的 WAV 读写、增益、变速（WSOLA 重叠相加）、静音裁剪与响度归一化。
+
+NumPy 为可选依赖；未安装时 HAS_NUMPY 为 False，插件会回退为由上游 API 处理 speed/gain。
+NumPy 在首次处理音频时才导入（见 load_numpy），不拖慢插件加载。
+本模块内的函数均为同步 CPU 计算，调用方应放到线程池中执行，避免阻塞事件循环。
+"""
+import importlib.util
+import wave
+
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+np = None
+
+
+def load_numpy():
+    """导入 numpy（仅首次调用时真正导入）。"""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+# 变速分析参数（秒）：帧长、相似度搜索半径
+_STRETCH_FRAME_SECONDS = 0.030
+_STRETCH_TOLERANCE_SECONDS = 0.010
+# 静音检测参数（秒）：能量分析窗长、裁剪后保留的首尾余量；超长截断时的淡出时长
+_SILENCE_WINDOW_SECONDS = 0.010
+_SILENCE_PAD_SECONDS = 0.050
+_CAP_FADE_SECONDS = 0.020
+
+
+def read_wav(path):
+    """读取 PCM WAV，返回 (samples[float32, 形状 (帧数, 声道数)], 采样率, 采样位宽)。"""
+    with wave.open(str(path), 'rb') as wf:
+        channels = wf.getnchannels()
+        width = wf.getsampwidth()
+        rate = wf.getframerate()
+        raw = wf.readframes(wf.getnframes())
+    if width == 2:
+        data = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif width == 4:
+        data = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+    elif width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    else:
+        raise ValueError(f"不支持的 WAV 采样位宽: {width * 8} bit")
+    usable = (data.shape[0] // channels) * channels
+    return data[:usable].reshape(-1, channels), rate, width
+
+
+def write_wav(path, samples, rate: int, width: int = 2) -> None:
+    """将 float 样本写为 PCM WAV；调用方负责传入临时路径并自行原子替换。"""
+    clipped = np.clip(samples, -1.0, 1.0)
+    if width == 4:
+        pcm = (clipped * 2147483647.0).astype('<i4')
+    elif width == 1:
+        pcm = (clipped * 127.0 + 128.0).astype(np.uint8)
+    else:
+        width = 2
+        pcm = (clipped * 32767.0).astype('<i2')
+    with wave.open(str(path), 'wb') as wf:
+        wf.setnchannels(samples.shape[1] if samples.ndim > 1 else 1)
+        wf.setsampwidth(width)
+        wf.setframerate(rate)
+        wf.writeframes(pcm.tobytes())
+
+
+def apply_gain(samples, gain_db: float):
+    """按 dB 调整音量，向量化乘法。"""
+    if not gain_db:
+        return samples
+    return samples * np.float32(10.0 ** (gain_db / 20.0))
+
+
+def time_stretch(samples, speed: float, rate: int):
+    """WSOLA 变速不变调：speed>1 变快（时长变短），speed<1 变慢。
+
+    每个输出帧在名义输入位置附近 ±tolerance 范围内，用互相关寻找与上一帧
+    自然延续最相似的片段，再以汉宁窗重叠相加，避免相位断裂带来的杂音。
+    """
+    n_in = samples.shape[0]
+    if n_in == 0 or abs(speed - 1.0) < 1e-3:
+        return samples
+    channels = samples.shape[1]
+    frame = max(256, int(rate * _STRETCH_FRAME_SECONDS)) & ~1
+    hop_out = frame // 2
+    hop_in = hop_out * speed
+    tol = max(1, int(rate * _STRETCH_TOLERANCE_SECONDS))
+    window = np.hanning(frame + 1)[:-1].astype(np.float32)
+
+    padded = np.concatenate([
+        np.zeros((tol, channels), dtype=np.float32),
+        samples.astype(np.float32, copy=False),
+        np.zeros((frame + tol, channels), dtype=np.float32),
+    ])
+    mono = padded.mean(axis=1)
+
+    n_frames = int(n_in / hop_in) + 1
+    out_len = (n_frames - 1) * hop_out + frame
+    out = np.zeros((out_len, channels), dtype=np.float32)
+    norm = np.zeros(out_len, dtype=np.float32)
+
+    prev = tol
+    for k in range(n_frames):
+        nominal = int(round(k * hop_in)) + tol
+        start = nominal
+        if k > 0:
+            target = mono[prev + hop_out: prev + hop_out + frame]
+            region = mono[nominal - tol: nominal + tol + frame]
+            if target.shape[0] == frame and region.shape[0] >= frame:
+                corr = np.correlate(region, target, mode='valid')
+                start = nominal - tol + int(np.argmax(corr))
+        seg = padded[start:start + frame]
+        if seg.shape[0] < frame:
+            seg = np.pad(seg, ((0, frame - seg.shape[0]), (0, 0)))
+        pos = k * hop_out
+        out[pos:pos + frame] += seg * window[:, None]
+        norm[pos:pos + frame] += window
+        prev = start
+
+    norm[norm < 1e-6] = 1.0
+    out /= norm[:, None]
+    return out[:max(1, int(round(n_in / speed)))]
+
+
+def trim_silence(samples, rate: int, threshold_db: float = -45.0):
+    """按短时能量裁掉首尾静音：以 10ms 窗计算 RMS（dBFS），保留首个到最后一个超过阈值的窗。
+
+    整段都低于阈值时原样返回，避免产出空音频。
+    """
+    n = samples.shape[0]
+    win = max(1, int(rate * _SILENCE_WINDOW_SECONDS))
+    n_frames = n // win
+    if n_frames == 0:
+        return samples
+    mono = samples.mean(axis=1)
+    frames = mono[:n_frames * win].reshape(n_frames, win)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    loud = np.flatnonzero(20.0 * np.log10(rms + 1e-10) > threshold_db)
+    if loud.size == 0:
+        return samples
+    pad = int(rate * _SILENCE_PAD_SECONDS)
+    start = max(0, int(loud[0]) * win - pad)
+    end = min(n, (int(loud[-1]) + 1) * win + pad)
+    return samples[start:end]
+
+
+def cap_duration(samples, rate: int, max_seconds: float):
+    """截断到最长 max_seconds 秒，并在末尾做短淡出避免爆音。"""
+    limit = int(rate * max_seconds)
+    if max_seconds <= 0 or samples.shape[0] <= limit:
+        return samples
+    out = samples[:limit].copy()
+    fade = min(limit, int(rate * _CAP_FADE_SECONDS))
+    if fade > 0:
+        out[-fade:] *= np.linspace(1.0, 0.0, fade, dtype=np.float32)[:, None]
+    return out
+
+
+def normalize_loudness(samples, mode: str, target_db: float):
+    """峰值（peak）或均方根（rms）响度归一化到 target_db（dBFS）；rms 模式下限制峰值不削波。"""
+    if mode not in ('peak', 'rms') or samples.shape[0] == 0:
+        return samples
+    peak = float(np.max(np.abs(samples)))
+    if peak <= 1e-6:
+        return samples
+    target = 10.0 ** (target_db / 20.0)
+    if mode == 'peak':
+        scale = target / peak
+    else:
+        rms = float(np.sqrt(np.mean(samples * samples)))
+        scale = min(target / rms, 0.999 / peak) if rms > 1e-9 else 1.0
+    return samples * np.float32(scale)
+
+
+def render_clip(src_path, dst_path, speed: float = 1.0, gain_db: float = 0.0,
+                trim: bool = False, silence_threshold_db: float = -45.0,
+                max_duration: float = 0.0, normalize: str = 'off', target_db: float = -1.0) -> int:
+    """读取基础音频，依次做静音裁剪、变速、时长截断、响度归一化与增益后写出到 dst_path。
+
+    返回静音裁剪与时长截断在输出音频上省下的字节数（按输出语速折算，不含变速本身带来的大小变化）。
+    """
+    load_numpy()
+    samples, rate, width = read_wav(src_path)
+    speed = float(speed)
+    trimmed_frames = 0
+    if trim:
+        before = samples.shape[0]
+        samples = trim_silence(samples, rate, float(silence_threshold_db))
+        trimmed_frames = before - samples.shape[0]
+    samples = time_stretch(samples, speed, rate)
+    before = samples.shape[0]
+    samples = cap_duration(samples, rate, float(max_duration))
+    capped_frames = before - samples.shape[0]
+    samples = normalize_loudness(samples, normalize, float(target_db))
+    samples = apply_gain(samples, float(gain_db))
+    write_wav(dst_path, samples, rate, width)
+    saved_frames = trimmed_frames / max(speed, 1e-6) + capped_frames
+    return int(round(saved_frames)) * samples.shape[1] * width
@@ -0,0 +1,136 @@
+"""批量离线合成：读取文本或 JSONL 文件，按有限并发预先合成并写入音频缓存，供在线回复直接复用。
+
+文件格式：
+- .txt：每行一段文本，空行与 # 开头的行会被忽略
+- .jsonl：每行一个对象，如 {"text": "...", "voice": "...", "speed": 1.0, "gain": 0.0}，后三项可省略
+
+已完成的条目记录在检查点文件（默认 <输入文件>.done）中，中断后重新运行会自动跳过。
+
+既可通过管理员命令 /vitsbatch 调用，也可在 AstrBot 根目录下独立运行：
+
+    python -m data.plugins.astrbot_plugin_VITS_pro.batch_tts lines.txt --concurrency 4
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+
+from astrbot.api import logger
+
+from .tts_scheduler import PRIORITY_BATCH
+
+DEFAULT_CONFIG_PATH = "data/config/astrbot_plugin_VITS_pro_config.json"
+
+
+def load_batch_items(path) -> list:
+    """读取批量合成条目，返回 [{'text', 'voice', 'speed', 'gain'}, ...]。"""
+    path = Path(path)
+    is_jsonl = path.suffix.lower() == '.jsonl'
+    items = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if not is_jsonl:
+                items.append({'text': line, 'voice': None, 'speed': None, 'gain': None})
+                continue
+            obj = json.loads(line)
+            if isinstance(obj, str):
+                obj = {'text': obj}
+            text = str(obj.get('text', '')).strip()
+            if text:
+                items.append({
+                    'text': text,
+                    'voice': obj.get('voice'),
+                    'speed': obj.get('speed'),
+                    'gain': obj.get('gain'),
+                })
+    return items
+
+
+def _item_key(item: dict) -> str:
+    """条目的稳定标识，用于检查点；输入文件增删行不影响已完成条目的识别。"""
+    return hashlib.sha1(json.dumps(item, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+async def run_batch(plugin, input_path, concurrency: int = 4, retries: int = 2, checkpoint_path=None) -> dict:
+    """批量合成 input_path 中的条目并写入 plugin 的音频缓存，返回统计信息。"""
+    if not plugin._audio_cache.enabled:
+        raise ValueError("批量合成需要开启音频缓存（audio_cache_max_entries > 0）")
+    started = time.monotonic()
+    items = await asyncio.to_thread(load_batch_items, input_path)
+    if len(items) > plugin._audio_cache.max_entries:
+        logger.warning(
+            f"批量条目数 {len(items)} 超过音频缓存上限 {plugin._audio_cache.max_entries}，较早合成的条目会被淘汰"
+        )
+    checkpoint = Path(checkpoint_path) if checkpoint_path else Path(str(input_path) + '.done')
+    done_keys = set()
+    if checkpoint.exists():
+        done_keys = set(checkpoint.read_text(encoding='utf-8').split())
+    pending = [item for item in items if _item_key(item) not in done_keys]
+    stats = {'total': len(items), 'skipped': len(items) - len(pending), 'done': 0, 'failed': 0, 'elapsed': 0.0}
+    semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+
+    with open(checkpoint, 'a', encoding='utf-8') as ckpt:
+        async def worker(item):
+            async with semaphore:
+                tts_input = await plugin._build_tts_input(item['text'])
+                voice = item['voice'] or plugin.api_voice
+                speed = plugin.speed if item['speed'] is None else float(item['speed'])
+                gain = plugin.gain if item['gain'] is None else float(item['gain'])
+                for attempt in range(retries + 1):
+                    try:
+                        await plugin._get_base_audio(tts_input, voice, speed, gain, priority=PRIORITY_BATCH)
+                        break
+                    except Exception as e:
+                        if attempt >= retries:
+                            stats['failed'] += 1
+                            logger.warning(f"批量合成失败（已重试 {retries} 次）: {item['text'][:30]} - {e}")
+                            return
+                        await asyncio.sleep(min(30.0, 2 ** attempt))
+                ckpt.write(_item_key(item) + '\n')
+                ckpt.flush()
+                stats['done'] += 1
+
+        await asyncio.gather(*(worker(item) for item in pending))
+
+    stats['elapsed'] = time.monotonic() - started
+    return stats
+
+
+def format_batch_stats(stats: dict) -> str:
+    return (
+        f"批量合成完成：共 {stats['total']} 条，新合成 {stats['done']} 条，"
+        f"已完成跳过 {stats['skipped']} 条，失败 {stats['failed']} 条，用时 {stats['elapsed']:.1f} 秒"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VITS 批量离线合成，结果写入插件音频缓存")
+    parser.add_argument('input', help="输入文件（.txt 每行一段文本，或 .jsonl）")
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH, help="插件配置文件路径")
+    parser.add_argument('--concurrency', type=int, default=4, help="最大并发数")
+    parser.add_argument('--retries', type=int, default=2, help="单条失败后的重试次数")
+    parser.add_argument('--checkpoint', default=None, help="检查点文件，默认 <输入文件>.done")
+    args = parser.parse_args(argv)
+
+    from .main import VITSPlugin
+
+    config_path = Path(args.config)
+    config = json.loads(config_path.read_text(encoding='utf-8-sig')) if config_path.exists() else {}
+
+    async def _run():
+        plugin = VITSPlugin(None, config)
+        try:
+            return await run_batch(plugin, args.input, args.concurrency, args.retries, args.checkpoint)
+        finally:
+            await plugin.terminate()
+
+    print(format_batch_stats(asyncio.run(_run())))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,9 @@
-from astrbot.api.event import filter, AstrMessageEvent
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain
 from astrbot.api.star import Context, Star, register, StarTools
 from astrbot.api import logger
 from astrbot.api.message_components import Record, Plain, Image, At, Reply, AtAll
 from pathlib import Path
 import re
-import aiohttp
 import json
 import random
 import asyncio
@@ -12,8 +11,24 @@ import os
 import uuid
 import time
 import hashlib
+import sys
+import shutil
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from . import audio_cache, audio_dsp
+from .audio_cache import AudioCache
+from .tts_backends import create_backend
+from .batch_tts import run_batch, format_batch_stats
+from .rate_limit import RateLimiter
+from .stream_tts import IncrementalSynthesis, concat_wavs
+from .profiling import ProfileSession, MAX_SECONDS as PROFILE_MAX_SECONDS
+from .tts_trace import NULL_TRACE, TraceRecorder
+from .tts_scheduler import (
+    TTSScheduler, PRIORITY_COMMAND, PRIORITY_VIP, PRIORITY_PRIVATE, PRIORITY_GROUP,
+)
+
 # 注册插件的装饰器
 @register("astrbot_plugin_VITS_pro", "Chris95743/第九位魔神", "语音合成插件", "1.7.0")
 class VITSPlugin(Star):
@@ -43,6 +58,54 @@ class VITSPlugin(Star):
         self.group_access_mode = self._normalize_access_mode(config.get('group_access_mode', 'disabled'))
         self.group_access_list = config.get('group_access_list', [])
         self.max_tts_chars = int(config.get('max_tts_chars', 0))  # 超过该长度跳过TTS，0为不限制
+        # 本地后处理：上游只合成中性语速/增益的基础音频，speed/gain 在本地用 NumPy 处理
+        self.local_audio_postprocess = bool(config.get('local_audio_postprocess', False))
+        self.audio_cache_max_entries = int(config.get('audio_cache_max_entries', 0))  # 0=关闭缓存（默认）
+        # 共享缓存目录：同机多个 AstrBot 实例填写同一路径即可复用彼此的合成结果，留空则使用插件数据目录
+        self.audio_cache_shared_dir = str(config.get('audio_cache_shared_dir', '') or '').strip()
+        self.dsp_workers = max(1, int(config.get('dsp_workers', 2)))
+        # TTS 后端：siliconflow / openai（OpenAI 兼容接口）/ local（本地替身引擎，离线可用）
+        self.tts_backend = self._normalize_backend_name(config.get('tts_backend', 'siliconflow'))
+        self.local_tts_dir = str(config.get('local_tts_dir', '') or '')
+        # 上游排队数达到该值时，群聊回复改用 local_tts_dir 中的预置音频（有对应文件时），0=关闭
+        self.local_overflow_queue_depth = max(0, int(config.get('local_overflow_queue_depth', 0)))
+        self._local_overflow_count = 0
+        self.local_tts_latency = float(config.get('local_tts_latency', 0.0))
+        self._backends = {}
+        self.batch_concurrency = max(1, int(config.get('batch_concurrency', 4)))
+        self.batch_retries = max(0, int(config.get('batch_retries', 2)))
+        self._batch_task = None
+        # 增量合成：LLM 回复按句切分后立即提交合成，最后按顺序拼接
+        self.stream_tts_enabled = bool(config.get('stream_tts_enabled', False))
+        self.stream_min_sentence_chars = max(1, int(config.get('stream_min_sentence_chars', 6)))
+        # 语音限时：超过该秒数仍未合成完成则先发文字，语音完成后补发；超过过期时间的语音丢弃
+        self.voice_deadline_seconds = float(config.get('voice_deadline_seconds', 0))
+        self.voice_stale_seconds = float(config.get('voice_stale_seconds', 60))
+        self._deferred_voice_tasks = set()
+        # 令牌桶限流：超出配额的消息直接以文字回复
+        self.rate_limit_enabled = bool(config.get('rate_limit_enabled', False))
+        self._rate_limiter = RateLimiter(
+            config.get('session_rate_per_minute', 6),
+            config.get('session_burst', 3),
+            config.get('global_rate_per_minute', 60),
+            config.get('global_burst', 10),
+        )
+        # VIP 会话：群号、QQ号或 unified_msg_origin，合成时优先调度
+        self.vip_sessions = {str(x).strip() for x in (config.get('vip_sessions', []) or []) if str(x).strip()}
+        # 合成后处理：静音裁剪、最长时长、响度归一化（同样依赖 numpy）
+        self.audio_trim_silence = bool(config.get('audio_trim_silence', False))
+        self.audio_silence_threshold_db = float(config.get('audio_silence_threshold_db', -45.0))
+        self.audio_max_duration = float(config.get('audio_max_duration', 0))  # 秒，0为不限制
+        self.audio_normalize = self._normalize_loudness_mode(config.get('audio_normalize', '关闭'))
+        self.audio_peak_target_db = float(config.get('audio_peak_target_db', -1.0))
+        self.audio_rms_target_db = float(config.get('audio_rms_target_db', -20.0))
+        self._postprocess_clips = 0
+        self._postprocess_bytes_saved = 0
+        # 按会话保存音色/语速/增益：开启后 /voice、/speed、/gain 只影响当前会话，全局配置作为回退
+        self.session_profiles_enabled = bool(config.get('session_profiles_enabled', False))
+        # 请求轨迹录制：写入匿名化 JSONL，供 tts_trace 回放比较调度/缓存/并发配置
+        self.trace_enabled = bool(config.get('trace_enabled', False))
+        self.trace_max_records = max(1, int(config.get('trace_max_records', 100000)))
         # 规范化基础 URL，移除多余斜杠
         if isinstance(self.api_url, str):
             self.api_url = self.api_url.rstrip('/')
@@ -51,40 +114,160 @@ class VITSPlugin(Star):
         # 简易去重缓存，避免同一会话短时间内重复合成
         self._recent_tts = {}
         self._dedup_ttl_seconds = 10
+        # 临时文件超过该秒数未更新才视为残留并清理，避免删掉其他请求正在使用的文件
+        self._stale_tmp_seconds = 600
         # 使用插件数据目录存放输出音频，避免污染源代码目录
-        try:
-            self.plugin_data_dir = StarTools.get_data_dir("astrbot_plugin_vits")
-        except Exception:
-            # 兜底：仍然使用源目录，但仅作为读取，不建议写入
-            self.plugin_data_dir = Path(__file__).parent
-        try:
-            Path(self.plugin_data_dir).mkdir(parents=True, exist_ok=True)
-        except Exception:
-            pass
-        # 使用专用输出目录保存每次合成的音频，文件名带时间戳，避免覆盖与缓存
+        self.plugin_data_dir = self._resolve_data_dir()
+        # 使用专用输出目录保存每次合成的音频，文件名带时间戳，避免覆盖与缓存；目录在后台启动任务中创建
         self._tts_output_dir = Path(self.plugin_data_dir) / "tts"
+        self._tts_stream_dir = self._tts_output_dir / "stream"
+        # 按优先级调度上游合成请求（命令 > VIP > 私聊 > 群聊 > 批量），并发上限默认 1
+        self._scheduler = TTSScheduler(
+            int(config.get('tts_max_concurrency', 1)),
+            float(config.get('priority_aging_seconds', 5.0)),
+        )
+        # 会话配置表：unified_msg_origin -> (voice, speed, gain)，None 表示沿用全局配置；
+        # 首次使用时从 session_profiles.json 懒加载，合成路径只做内存查表
+        self._session_profiles = {}
+        self._session_profiles_path = Path(self.plugin_data_dir) / "session_profiles.json"
+        self._session_profiles_loaded = False
+        self._session_profiles_lock = asyncio.Lock()
+        self._session_profiles_load_task = None
+        self._tracer = None
+        # 按需性能剖析（/vitsprof），未开启时为 None
+        self._profile_session = None
+        self._profile_umo = None
+        self._profile_task = None
+        if self.trace_enabled:
+            self._tracer = TraceRecorder(
+                Path(self.plugin_data_dir) / "traces" / f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                self.trace_max_records,
+            )
+        # 基础音频缓存与本地 DSP 线程池
+        if self.audio_cache_shared_dir:
+            self._audio_cache = AudioCache(
+                Path(self.audio_cache_shared_dir).expanduser(), self.audio_cache_max_entries, shared=True
+            )
+            if not audio_cache.HAS_FILE_LOCK:
+                logger.warning("当前系统不支持 fcntl 文件锁，共享缓存无法跨进程去重，多个实例可能重复合成同一文本。")
+        else:
+            self._audio_cache = AudioCache(self._tts_output_dir / "cache", self.audio_cache_max_entries)
+        self._dsp_executor = ThreadPoolExecutor(max_workers=self.dsp_workers, thread_name_prefix="vits_dsp")
+        if self.local_audio_postprocess and not audio_dsp.HAS_NUMPY:
+            logger.warning("已开启本地语速/增益处理，但未安装 numpy，将回退为由 API 处理 speed/gain。")
+        if self._audio_stage_configured() and not audio_dsp.HAS_NUMPY:
+            logger.warning("已开启静音裁剪/时长限制/响度归一化，但未安装 numpy，该后处理不会生效。")
+        # 构造函数只解析配置；建目录、加载缓存索引、清理历史音频、拉取音色列表与连接预热
+        # 都放到后台启动任务中，避免拖慢 AstrBot 加载/重载插件
+        self._storage_ready = asyncio.Event()
+        self._startup_done = False
+        self._startup_timings = {}
+        self._startup_elapsed = 0.0
+        self._startup_task = None
+        self._custom_voices_cache = None  # (获取时间, 音色列表)
+        self._custom_voices_ttl = 300
         try:
-            self._tts_output_dir.mkdir(parents=True, exist_ok=True)
-        except Exception:
+            self._startup_task = asyncio.get_running_loop().create_task(self._startup())
+        except RuntimeError:
+            # 无运行中的事件循环（如被脚本直接构造），首次合成时再启动
             pass
-        self._tts_lock = asyncio.Lock()
-        # 启动时清理历史文件，保证重载后策略仍然生效
+
+    def _resolve_data_dir(self):
+        """插件数据目录；音频、缓存、会话配置与轨迹等文件都放在其下（回放时由子类指向临时目录）。"""
         try:
-            self._enforce_audio_retention()
+            return StarTools.get_data_dir("astrbot_plugin_vits")
         except Exception:
-            pass
+            # 兜底：仍然使用源目录，但仅作为读取，不建议写入
+            return Path(__file__).parent
 
     @filter.on_llm_response()
     async def _cache_llm_response_text(self, event: AstrMessageEvent, response):
         """缓存原始 LLM 文本，供 TTS 使用，避免后续装饰插件改写。"""
         try:
             text = getattr(response, 'completion_text', '') or ''
-            if text:
+            is_chunk = bool(getattr(response, 'is_chunk', False))
+            # 流式分片只是增量片段，原始文本以完整回复为准
+            if text and not is_chunk:
                 try:
                     event.set_extra('vits_raw_text', text)
                     event.set_extra('vits_has_llm', True)
                 except Exception:
                     pass
+            if self.stream_tts_enabled:
+                self._feed_stream_job(event, text, is_chunk)
+        except Exception:
+            pass
+
+    def _feed_stream_job(self, event: AstrMessageEvent, text: str, is_chunk: bool) -> None:
+        """增量合成：把 LLM 流式分片逐段喂给本次回复的合成任务，完整回复到达时收尾。
+
+        只有收到流式分片时才启用；完整回复一次到达（AstrBot 目前只以最终回复触发 on_llm_response）时
+        不创建任务，按整段合成，避免生成结束后再分句只会增加上游调用次数与耗时。
+        每次喂入后对已累计的文本复查长度与跳过关键词，命中即取消，避免为最终以文字发送的回复付费合成。
+        """
+        session_key = getattr(event, 'unified_msg_origin', None) or event.get_session_id()
+        job = event.get_extra('vits_stream_job')
+        if job is None:
+            if not is_chunk or event.get_extra('vits_prob_decided') is not None:
+                return
+            if not (self.enabled and self._is_session_allowed(event)):
+                return
+            # 概率判定提前到这里做一次，后续 _convert_to_speech 沿用该结果
+            passed = self._roll_tts_probability()
+            event.set_extra('vits_prob_decided', passed)
+            if not passed:
+                return
+            # 限流同样提前判定，避免被限流的回复白白消耗合成额度
+            if self.rate_limit_enabled:
+                allowed = self._rate_limiter.allow(session_key)
+                event.set_extra('vits_rate_allowed', allowed)
+                if not allowed:
+                    return
+            job = self._create_stream_job(event)
+            event.set_extra('vits_stream_job', job)
+            job.feed(text)
+        elif is_chunk:
+            job.feed(text)
+        if job.cancelled:
+            return
+        if (self.max_tts_chars > 0 and len(job.text) > self.max_tts_chars) or self._matches_skip_keyword(job.text):
+            # 最终会跳过TTS，停止继续合成
+            self._cancel_stream_job(event, job, session_key)
+        elif not is_chunk:
+            if self._is_duplicate_request(session_key, job.text.strip(), mark=False):
+                self._cancel_stream_job(event, job, session_key)
+            else:
+                job.finish()
+
+    def _cancel_stream_job(self, event: AstrMessageEvent, job: IncrementalSynthesis, session_key: str) -> None:
+        """取消增量合成；已为其扣除的限流令牌一并归还。"""
+        job.cancel()
+        if event.get_extra('vits_rate_allowed'):
+            self._rate_limiter.refund(session_key)
+            event.set_extra('vits_rate_allowed', None)
+
+    def _create_stream_job(self, event: AstrMessageEvent) -> IncrementalSynthesis:
+        session_key = getattr(event, 'unified_msg_origin', None) or event.get_session_id()
+        profile = self._resolve_session_profile(session_key)
+        priority = self._classify_priority(event)
+
+        async def synthesize(sentence: str) -> Path:
+            tts_input = await self._build_tts_input(sentence)
+            # 分句音频放在单独的子目录，等待收尾拼接期间不受 tts/ 目录清理影响
+            tmp_path = (self._tts_stream_dir / f"{uuid.uuid4().hex}.tmp").resolve()
+            await self._synthesize_audio(tts_input, tmp_path, profile, priority)
+            return tmp_path
+
+        return IncrementalSynthesis(synthesize, self.stream_min_sentence_chars)
+
+    def _discard_stream_job(self, event: AstrMessageEvent) -> None:
+        """取消未被 _convert_to_speech 接管的增量合成任务（如回复因重复或过滤被跳过），并归还其限流令牌。"""
+        try:
+            job = event.get_extra('vits_stream_job')
+            if job is not None:
+                session_key = getattr(event, 'unified_msg_origin', None) or event.get_session_id()
+                self._cancel_stream_job(event, job, session_key)
+                event.set_extra('vits_stream_job', None)
         except Exception:
             pass
 
@@ -256,7 +439,10 @@ class VITSPlugin(Star):
         return final_audio_path, tmp_audio_path
 
     def _enforce_audio_retention(self):
-        """按配置最大数量保留音频文件；超过上限删除最早的，同时顺带清理残留的 .tmp。"""
+        """按配置最大数量保留音频文件；超过上限删除最早的，同时顺带清理残留的 .tmp。
+
+        并发合成时其他请求的临时文件仍在写入，只删除超过 _stale_tmp_seconds 未更新的残留文件。
+        """
         try:
             out_dir = getattr(self, '_tts_output_dir', None)
             if not out_dir or not Path(out_dir).exists():
@@ -272,14 +458,102 @@ class VITSPlugin(Star):
                         except Exception:
                             pass
             # 清理残留临时文件
-            for tmp in Path(out_dir).glob('*.tmp'):
+            now = time.time()
+            for tmp in [*Path(out_dir).glob('*.tmp'), *Path(out_dir).glob('stream/*.tmp')]:
                 try:
-                    tmp.unlink()
+                    if now - tmp.stat().st_mtime > self._stale_tmp_seconds:
+                        tmp.unlink()
                 except Exception:
                     pass
         except Exception as e:
             logger.warning(f"清理历史音频失败: {e}")
 
+    async def _startup(self):
+        """后台启动任务：依次执行各初始化阶段并记录耗时，单个阶段失败不影响其余阶段。"""
+        started = time.monotonic()
+
+        async def phase(name, coro):
+            t0 = time.monotonic()
+            try:
+                await coro
+            except Exception as e:
+                logger.warning(f"VITS 插件初始化阶段「{name}」失败: {e}")
+            self._startup_timings[name] = time.monotonic() - t0
+
+        def make_dirs():
+            Path(self.plugin_data_dir).mkdir(parents=True, exist_ok=True)
+            self._tts_output_dir.mkdir(parents=True, exist_ok=True)
+            self._tts_stream_dir.mkdir(exist_ok=True)
+
+        try:
+            await phase("创建目录", asyncio.to_thread(make_dirs))
+            if self._audio_cache.enabled:
+                await phase("缓存索引", asyncio.to_thread(self._audio_cache.load_index))
+            # 目录与缓存索引就绪后即可开始合成，其余阶段不阻塞首条语音
+            self._storage_ready.set()
+            # 清理历史文件，保证重载后策略仍然生效；此时首批回复可能已在写入临时文件，
+            # _enforce_audio_retention 只删除超过 _stale_tmp_seconds 的残留 .tmp，不会误删
+            await phase("清理历史音频", asyncio.to_thread(self._enforce_audio_retention))
+            if self.session_profiles_enabled:
+                await phase("会话配置", self._ensure_session_profiles_loaded())
+            if audio_dsp.HAS_NUMPY and (self.local_audio_postprocess or self._audio_stage_configured()):
+                await phase("加载 numpy", asyncio.get_running_loop().run_in_executor(
+                    self._dsp_executor, audio_dsp.load_numpy
+                ))
+            if self.tts_backend == 'siliconflow' and self.api_url and self.api_key:
+                # 拉取音色列表的同时建立到上游的连接，首次合成可直接复用
+                await phase("音色列表与连接预热", self._fetch_custom_voices(refresh=True))
+        finally:
+            self._storage_ready.set()
+            self._startup_elapsed = time.monotonic() - started
+            self._startup_done = True
+        logger.info(f"VITS 插件初始化完成，用时 {self._startup_elapsed * 1000:.0f}ms（{self._startup_timings_text()}）")
+
+    def _startup_timings_text(self) -> str:
+        return "，".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self._startup_timings.items())
+
+    async def _ensure_storage_ready(self):
+        """等待输出目录与缓存索引就绪；启动任务尚未创建（无事件循环时构造）则在此启动。"""
+        if self._storage_ready.is_set():
+            return
+        if self._startup_task is None:
+            self._startup_task = asyncio.get_running_loop().create_task(self._startup())
+        await self._storage_ready.wait()
+
+    async def _fetch_custom_voices(self, refresh: bool = False) -> list:
+        """获取用户自定义音色列表，结果缓存 _custom_voices_ttl 秒；失败时返回空列表且不缓存。"""
+        cached = self._custom_voices_cache
+        if not refresh and cached is not None and time.monotonic() - cached[0] < self._custom_voices_ttl:
+            return cached[1]
+        custom_voices = []
+        try:
+            url = f"{self.api_url}/audio/voice/list"
+            headers = {"Authorization": f"Bearer {self.api_key}"}
+            # 复用硅基流动后端的连接会话
+            session = self._get_backend('siliconflow')._get_session()
+            async with session.get(url, headers=headers) as response:
+                if response.status != 200:
+                    logger.warning(f"获取自定义音色列表失败，状态码: {response.status}")
+                    return custom_voices
+                voice_list = json.loads(await response.text())
+            # 尝试多种可能的数据结构
+            if voice_list and isinstance(voice_list, dict):
+                for key in ('data', 'result', 'voices', 'items'):
+                    if key in voice_list:
+                        custom_voices = voice_list[key]
+                        break
+                else:
+                    custom_voices = [voice_list]
+            elif isinstance(voice_list, list):
+                custom_voices = voice_list
+            if not isinstance(custom_voices, list):
+                custom_voices = [custom_voices] if custom_voices else []
+        except Exception as e:
+            logger.warning(f"获取自定义音色列表失败: {e}")
+            return []
+        self._custom_voices_cache = (time.monotonic(), custom_voices)
+        return custom_voices
+
     def _normalize_access_mode(self, value) -> str:
         """将配置中的访问模式归一化为内部标识：disabled/whitelist/blacklist。
         同时兼容中文选项：不限制/白名单/黑名单。
@@ -304,6 +578,153 @@ class VITSPlugin(Star):
             return mapping[value]
         return 'disabled'
 
+    def _normalize_backend_name(self, value) -> str:
+        """将后端配置归一化为 siliconflow/openai/local，未知值回退为 siliconflow。"""
+        try:
+            text = str(value).strip().lower()
+        except Exception:
+            return 'siliconflow'
+        return text if text in ('siliconflow', 'openai', 'local') else 'siliconflow'
+
+    def _get_backend(self, name: str):
+        """按名称获取（必要时创建）后端实例，同名后端复用同一个连接会话。"""
+        backend = self._backends.get(name)
+        if backend is None:
+            backend = create_backend(
+                name, self.api_url, self.api_key, self.api_name,
+                local_audio_dir=self.local_tts_dir, local_latency=self.local_tts_latency,
+            )
+            self._backends[name] = backend
+        return backend
+
+    def _normalize_loudness_mode(self, value) -> str:
+        """将响度归一化配置归一化为内部标识：off/peak/rms，兼容中文选项：关闭/峰值/RMS。"""
+        try:
+            text = str(value).strip().lower()
+        except Exception:
+            return 'off'
+        mapping = {
+            'off': 'off',
+            'peak': 'peak',
+            'rms': 'rms',
+            '关闭': 'off',
+            '峰值': 'peak',
+        }
+        return mapping.get(text, 'off')
+
+    def _read_session_profiles_file(self) -> dict:
+        """读取会话配置文件（同步，需在线程中调用）。"""
+        if not self._session_profiles_path.exists():
+            return {}
+        raw = json.loads(self._session_profiles_path.read_text(encoding='utf-8'))
+        table = {}
+        for umo, item in (raw or {}).items():
+            if not isinstance(item, dict):
+                continue
+            voice = item.get('voice')
+            speed = item.get('speed')
+            gain = item.get('gain')
+            table[str(umo)] = (
+                sys.intern(str(voice)) if voice else None,
+                float(speed) if speed is not None else None,
+                float(gain) if gain is not None else None,
+            )
+        return table
+
+    def _write_session_profiles_file(self, data: dict) -> None:
+        """原子写入会话配置文件（同步，需在线程中调用）。"""
+        self._session_profiles_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._session_profiles_path.with_suffix('.json.tmp')
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(tmp_path, self._session_profiles_path)
+
+    async def _ensure_session_profiles_loaded(self):
+        """懒加载会话配置表，只会真正读取一次磁盘。"""
+        if self._session_profiles_loaded:
+            return
+        async with self._session_profiles_lock:
+            if self._session_profiles_loaded:
+                return
+            try:
+                table = await asyncio.to_thread(self._read_session_profiles_file)
+            except Exception as e:
+                logger.warning(f"读取会话配置失败: {e}")
+                table = {}
+            for umo, entry in table.items():
+                self._session_profiles.setdefault(umo, entry)
+            self._session_profiles_loaded = True
+
+    async def _save_session_profiles(self):
+        """保存会话配置表；多次保存在锁内串行执行，快照在持锁后生成，保证最后写入的是最新状态。"""
+        async with self._session_profiles_lock:
+            data = {}
+            for umo, (voice, speed, gain) in self._session_profiles.items():
+                item = {}
+                if voice is not None:
+                    item['voice'] = voice
+                if speed is not None:
+                    item['speed'] = speed
+                if gain is not None:
+                    item['gain'] = gain
+                data[umo] = item
+            try:
+                await asyncio.to_thread(self._write_session_profiles_file, data)
+            except Exception as e:
+                logger.error(f"保存会话配置失败: {e}")
+
+    def _resolve_session_profile(self, session_key):
+        """返回会话生效的 (voice, speed, gain)，未设置的字段回退到全局配置。
+
+        仅做一次字典查找，不触发磁盘 I/O；配置表尚未加载时在后台加载并暂用全局配置。
+        """
+        if not self.session_profiles_enabled:
+            return self.api_voice, self.speed, self.gain
+        if not self._session_profiles_loaded and self._session_profiles_load_task is None:
+            try:
+                self._session_profiles_load_task = asyncio.get_running_loop().create_task(
+                    self._ensure_session_profiles_loaded()
+                )
+            except RuntimeError:
+                pass
+        entry = self._session_profiles.get(session_key)
+        if entry is None:
+            return self.api_voice, self.speed, self.gain
+        voice, speed, gain = entry
+        return (
+            self.api_voice if voice is None else voice,
+            self.speed if speed is None else speed,
+            self.gain if gain is None else gain,
+        )
+
+    async def _set_voice_param(self, event: AstrMessageEvent, field: str, value) -> str:
+        """设置 voice/speed/gain：开启会话配置时写入当前会话，否则修改全局配置。返回作用范围说明。"""
+        if self.session_profiles_enabled:
+            await self._ensure_session_profiles_loaded()
+            umo = getattr(event, 'unified_msg_origin', None) or event.get_session_id()
+            voice, speed, gain = self._session_profiles.get(umo, (None, None, None))
+            if field == 'voice':
+                voice = sys.intern(value)
+            elif field == 'speed':
+                speed = value
+            else:
+                gain = value
+            self._session_profiles[umo] = (voice, speed, gain)
+            await self._save_session_profiles()
+            return "（仅当前会话）"
+        if field == 'voice':
+            self.api_voice = value
+        elif field == 'speed':
+            self.speed = value
+        else:
+            self.gain = value
+        # 持久化
+        self._save_config_field(field, value)
+        return ""
+
+    def _current_voice_params(self, event: AstrMessageEvent):
+        umo = getattr(event, 'unified_msg_origin', None) or event.get_session_id()
+        return self._resolve_session_profile(umo)
+
     @filter.command("vits", priority=1)
     async def vits(self, event: AstrMessageEvent):
         """启用/禁用语音插件"""
@@ -349,37 +770,8 @@ class VITSPlugin(Star):
     async def vits_voices(self, event: AstrMessageEvent):
         """查看所有可用的音色列表"""
         try:
-            # 获取用户自定义音色列表
-            custom_voices = []
-            try:
-                url = f"{self.api_url}/audio/voice/list"
-                headers = {"Authorization": f"Bearer {self.api_key}"}
-                
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url, headers=headers) as response:
-                        if response.status == 200:
-                            response_text = await response.text()
-                            voice_list = json.loads(response_text)
-                            
-                            # 尝试多种可能的数据结构
-                            if voice_list and isinstance(voice_list, dict):
-                                if 'data' in voice_list:
-                                    custom_voices = voice_list['data']
-                                elif 'result' in voice_list:
-                                    custom_voices = voice_list['result']
-                                elif 'voices' in voice_list:
-                                    custom_voices = voice_list['voices']
-                                elif 'items' in voice_list:
-                                    custom_voices = voice_list['items']
-                                elif isinstance(voice_list, list):
-                                    custom_voices = [voice_list] if voice_list else []
-                                else:
-                                    custom_voices = [voice_list] if voice_list else []
-                            elif isinstance(voice_list, list):
-                                custom_voices = voice_list
-                                
-            except Exception as e:
-                logger.warning(f"获取自定义音色列表失败: {e}")
+            # 获取用户自定义音色列表（带短期缓存，启动时已在后台预取）
+            custom_voices = await self._fetch_custom_voices()
             
             # 构建音色信息
             voice_info = "可用音色列表\n"
@@ -429,7 +821,7 @@ class VITSPlugin(Star):
         
         if len(parts) < 2:
             # 显示当前音色和使用说明
-            current_voice = self.api_voice if self.api_voice else "未设置"
+            current_voice = self._current_voice_params(event)[0] or "未设置"
             help_text = f"当前音色：{current_voice}\n\n"
             help_text += "使用方法：/voice <音色名>\n\n"
             help_text += "可用的系统预置音色：\n"
@@ -452,64 +844,37 @@ class VITSPlugin(Star):
         system_voices = self._get_system_voices_dict()
         
         # 获取用户自定义音色列表
-        custom_voices = {}
-        try:
-            url = f"{self.api_url}/audio/voice/list"
-            headers = {"Authorization": f"Bearer {self.api_key}"}
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        response_text = await response.text()
-                        voice_list = json.loads(response_text)
-                        
-                        # 解析自定义音色数据
-                        if voice_list and isinstance(voice_list, dict):
-                            if 'data' in voice_list:
-                                voices_data = voice_list['data']
-                            elif 'result' in voice_list:
-                                voices_data = voice_list['result']
-                            elif 'voices' in voice_list:
-                                voices_data = voice_list['voices']
-                            elif 'items' in voice_list:
-                                voices_data = voice_list['items']
-                            else:
-                                voices_data = voice_list if isinstance(voice_list, list) else []
-                        elif isinstance(voice_list, list):
-                            voices_data = voice_list
-                        else:
-                            voices_data = []
-                        
-                        # 构建自定义音色字典
-                        for voice in voices_data:
-                            if isinstance(voice, dict):
-                                voice_name_key = voice.get('name', voice.get('customName', ''))
-                                voice_uri = voice.get('uri', voice.get('id', ''))
-                                if voice_name_key and voice_uri:
-                                    custom_voices[voice_name_key] = voice_uri
-        except Exception as e:
-            logger.warning(f"获取自定义音色列表失败: {e}")
+        async def load_custom_voices(refresh: bool) -> dict:
+            voices = {}
+            for voice in await self._fetch_custom_voices(refresh=refresh):
+                if isinstance(voice, dict):
+                    voice_name_key = voice.get('name', voice.get('customName', ''))
+                    voice_uri = voice.get('uri', voice.get('id', ''))
+                    if voice_name_key and voice_uri:
+                        voices[voice_name_key] = voice_uri
+            return voices
+
+        custom_voices = await load_custom_voices(refresh=False)
+        if voice_name_lower not in system_voices and voice_name not in custom_voices:
+            # 缓存中没有时重新拉取，刚上传的自定义音色无需等缓存过期
+            custom_voices = await load_custom_voices(refresh=True)
         
         # 检查是否是系统预置音色
         if voice_name_lower in system_voices:
             # 构建新的音色配置
             new_voice = f"{self.api_name}:{voice_name_lower}"
-            self.api_voice = new_voice
-            # 持久化
-            self._save_config_field('voice', new_voice)
+            scope = await self._set_voice_param(event, 'voice', new_voice)
             
             voice_desc = system_voices[voice_name_lower]
-            yield event.plain_result(f"已切换到系统音色：{voice_name_lower} ({voice_desc})\n配置：{new_voice}")
+            yield event.plain_result(f"已切换到系统音色{scope}：{voice_name_lower} ({voice_desc})\n配置：{new_voice}")
         
         # 检查是否是自定义音色
         elif voice_name in custom_voices:
             # 使用自定义音色的完整URI
             new_voice = custom_voices[voice_name]
-            self.api_voice = new_voice
-            # 持久化
-            self._save_config_field('voice', new_voice)
+            scope = await self._set_voice_param(event, 'voice', new_voice)
             
-            yield event.plain_result(f"已切换到自定义音色：{voice_name}\n配置：{new_voice}")
+            yield event.plain_result(f"已切换到自定义音色{scope}：{voice_name}\n配置：{new_voice}")
         
         else:
             # 不支持的音色
@@ -573,7 +938,7 @@ class VITSPlugin(Star):
         
         if len(parts) < 2:
             # 显示当前速度设置
-            yield event.plain_result(f"当前音频播放速度：{self.speed}\n\n使用方法：/speed <速度值>\n\n示例：\n/speed 1.0  # 正常速度\n/speed 1.5  # 1.5倍速\n/speed 0.5  # 0.5倍速\n\n有效范围：0.25 - 4.0")
+            yield event.plain_result(f"当前音频播放速度：{self._current_voice_params(event)[1]}\n\n使用方法：/speed <速度值>\n\n示例：\n/speed 1.0  # 正常速度\n/speed 1.5  # 1.5倍速\n/speed 0.5  # 0.5倍速\n\n有效范围：0.25 - 4.0")
             return
         
         try:
@@ -585,16 +950,14 @@ class VITSPlugin(Star):
                 return
             
             # 更新速度设置
-            self.speed = new_speed
-            # 持久化
-            self._save_config_field('speed', new_speed)
+            scope = await self._set_voice_param(event, 'speed', new_speed)
             
             if new_speed == 1.0:
-                yield event.plain_result("已设置音频播放速度为正常速度（1.0倍）。")
+                yield event.plain_result(f"已设置音频播放速度为正常速度（1.0倍）{scope}。")
             elif new_speed < 1.0:
-                yield event.plain_result(f"已设置音频播放速度为{new_speed}倍，语音将变慢。")
+                yield event.plain_result(f"已设置音频播放速度为{new_speed}倍{scope}，语音将变慢。")
             else:
-                yield event.plain_result(f"已设置音频播放速度为{new_speed}倍，语音将变快。")
+                yield event.plain_result(f"已设置音频播放速度为{new_speed}倍{scope}，语音将变快。")
                 
         except ValueError:
             yield event.plain_result("请输入有效的数字！\n\n示例：/speed 1.5")
@@ -608,7 +971,7 @@ class VITSPlugin(Star):
         
         if len(parts) < 2:
             # 显示当前增益设置
-            yield event.plain_result(f"当前音频增益：{self.gain}dB\n\n使用方法：/gain <增益值>\n\n示例：\n/gain 0    # 默认音量\n/gain 3    # 增加3dB（更响）\n/gain -3   # 减少3dB（更轻）\n\n有效范围：-10 到 10 dB")
+            yield event.plain_result(f"当前音频增益：{self._current_voice_params(event)[2]}dB\n\n使用方法：/gain <增益值>\n\n示例：\n/gain 0    # 默认音量\n/gain 3    # 增加3dB（更响）\n/gain -3   # 减少3dB（更轻）\n\n有效范围：-10 到 10 dB")
             return
         
         try:
@@ -620,16 +983,14 @@ class VITSPlugin(Star):
                 return
             
             # 更新增益设置
-            self.gain = new_gain
-            # 持久化
-            self._save_config_field('gain', new_gain)
+            scope = await self._set_voice_param(event, 'gain', new_gain)
             
             if new_gain == 0.0:
-                yield event.plain_result("已设置音频增益为默认值（0dB）。")
+                yield event.plain_result(f"已设置音频增益为默认值（0dB）{scope}。")
             elif new_gain < 0:
-                yield event.plain_result(f"已设置音频增益为{new_gain}dB，音量将降低。")
+                yield event.plain_result(f"已设置音频增益为{new_gain}dB{scope}，音量将降低。")
             else:
-                yield event.plain_result(f"已设置音频增益为{new_gain}dB，音量将提高。")
+                yield event.plain_result(f"已设置音频增益为{new_gain}dB{scope}，音量将提高。")
                 
         except ValueError:
             yield event.plain_result("请输入有效的数字！\n\n示例：/gain 3")
@@ -640,83 +1001,259 @@ class VITSPlugin(Star):
         info_text = f"VITS插件配置信息：\n"
         info_text += f"状态：{'启用' if self.enabled else '禁用'}\n"
         info_text += f"全局开关配置：{'启用' if self.config.get('global_enabled', True) else '禁用'}\n"
+        info_text += f"TTS后端：{self.tts_backend}\n"
         info_text += f"音色：{self.api_voice}\n"
         info_text += f"播放速度：{self.speed}\n"
         info_text += f"音频增益：{self.gain}dB\n"
+        if self.session_profiles_enabled:
+            await self._ensure_session_profiles_loaded()
+            voice, speed, gain = self._current_voice_params(event)
+            info_text += f"当前会话：音色={voice}，速度={speed}，增益={gain}dB（共 {len(self._session_profiles)} 个会话配置）\n"
         info_text += f"转换概率：{self.tts_probability}%\n"
         info_text += f"最大TTS字符：{self.max_tts_chars if self.max_tts_chars > 0 else '不限制'}\n"
         info_text += f"跳过关键词：{', '.join(self.skip_tts_keywords)}\n"
-        info_text += f"仅对AI模型TTS：{'开启' if self.only_llm_tts else '关闭'}\n\n"
+        info_text += f"仅对AI模型TTS：{'开启' if self.only_llm_tts else '关闭'}\n"
+        info_text += f"本地语速/增益处理：{'开启' if self._use_local_postprocess() else '关闭'}\n"
+        if self._startup_done:
+            info_text += f"初始化：已就绪，用时 {self._startup_elapsed * 1000:.0f}ms（{self._startup_timings_text()}）\n"
+        else:
+            info_text += "初始化：进行中\n"
+        info_text += f"基础音频缓存：{self._audio_cache.stats_text()}\n"
+        if self.rate_limit_enabled:
+            info_text += f"限流：{self._rate_limiter.stats_text()}\n"
+        if self._audio_stage_options():
+            info_text += f"音频后处理：已处理 {self._postprocess_clips} 段，累计节省 {self._postprocess_bytes_saved} 字节\n"
+        info_text += "\n"
         info_text += "说明：状态显示当前运行状态，全局开关配置显示重启后的默认状态"
         yield event.plain_result(info_text)
 
-    async def _create_speech_request(self, tts_input_text: str, output_audio_path: Path):
-        """创建语音合成请求"""
+    @filter.command("vitsprofile", priority=1)
+    async def vits_profile(self, event: AstrMessageEvent):
+        """查看或重置当前会话的音色/语速/增益配置。用法：/vitsprofile [reset]"""
+        if not self.session_profiles_enabled:
+            yield event.plain_result("未开启按会话配置（session_profiles_enabled），/voice、/speed、/gain 当前作用于全局。")
+            return
+        await self._ensure_session_profiles_loaded()
+        umo = getattr(event, 'unified_msg_origin', None) or event.get_session_id()
+        parts = event.get_message_str().strip().split()
+        if len(parts) >= 2 and parts[1].lower() == 'reset':
+            if self._session_profiles.pop(umo, None) is not None:
+                await self._save_session_profiles()
+            yield event.plain_result("已重置当前会话配置，恢复使用全局音色、语速与增益。")
+            return
+        voice, speed, gain = self._resolve_session_profile(umo)
+        custom = umo in self._session_profiles
+        text = f"当前会话配置{'（自定义）' if custom else '（沿用全局）'}：\n"
+        text += f"音色：{voice}\n播放速度：{speed}\n音频增益：{gain}dB\n\n"
+        text += "使用 /voice、/speed、/gain 修改当前会话，/vitsprofile reset 恢复全局配置"
+        yield event.plain_result(text)
+
+    async def _create_speech_request(self, tts_input_text: str, output_audio_path: Path, speed=None, gain=None, voice=None, backend=None):
+        """创建语音合成请求；speed/gain/voice 未指定时使用全局配置，backend 未指定时使用配置的后端"""
+        speed = self.speed if speed is None else speed
+        gain = self.gain if gain is None else gain
+        voice = self.api_voice if voice is None else voice
+        backend = backend or self._get_backend(self.tts_backend)
         try:
-            # 构建请求数据
-            request_data = {
-                "model": self.api_name,
-                "input": tts_input_text,
-                "response_format": "wav"
-            }
-            
-            # 添加音色参数
-            if self.api_voice:
-                request_data["voice"] = self.api_voice
-            
-            # 添加speed和gain参数
-            if self.speed != 1.0:
-                request_data["speed"] = self.speed
-            if self.gain != 0.0:
-                request_data["gain"] = self.gain
-            
-            # 设置请求头
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f"Bearer {self.api_key}"
-            }
-            
-            # 使用aiohttp发送请求
-            url = f"{self.api_url}/audio/speech"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=request_data, headers=headers) as response:
-                    if response.status == 200:
-                        # 将响应内容写入文件
-                        with open(output_audio_path, 'wb') as f:
-                            async for chunk in response.content.iter_chunked(8192):
-                                f.write(chunk)
-                        return True
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"API请求失败，状态码: {response.status}, 错误信息: {error_text}")
-                
+            await backend.synthesize(tts_input_text, output_audio_path, voice, speed, gain)
+            return True
         except Exception as e:
             logger.error(f"语音转换失败: {e}")
             raise e
 
-    async def _should_skip_tts(self, text: str) -> bool:
-        """检查是否应该跳过TTS转换"""
+    def _select_backend_name(self, tts_input: str, priority: int) -> str:
+        """上游排队数达到 local_overflow_queue_depth 时，群聊回复改用 local_tts_dir 中的预置音频。
+
+        只有预置音频可以顶替上游结果，没有对应文件时不会退回正弦波占位音频；
+        批量预合成的目的就是写入上游音频缓存，始终走上游。
+        """
+        if (self.local_overflow_queue_depth > 0 and self.tts_backend != 'local'
+                and priority == PRIORITY_GROUP and self._scheduler.queued >= self.local_overflow_queue_depth
+                and self._get_backend('local').clip_path(tts_input) is not None):
+            self._local_overflow_count += 1
+            return 'local'
+        return self.tts_backend
+
+    def _use_local_postprocess(self) -> bool:
+        return self.local_audio_postprocess and audio_dsp.HAS_NUMPY
+
+    def _audio_stage_configured(self) -> bool:
+        return self.audio_trim_silence or self.audio_max_duration > 0 or self.audio_normalize != 'off'
+
+    def _audio_stage_options(self) -> dict:
+        """静音裁剪/时长限制/响度归一化阶段的参数，未开启时返回空字典。"""
+        if not (audio_dsp.HAS_NUMPY and self._audio_stage_configured()):
+            return {}
+        target_db = self.audio_rms_target_db if self.audio_normalize == 'rms' else self.audio_peak_target_db
+        return {
+            'trim': self.audio_trim_silence,
+            'silence_threshold_db': self.audio_silence_threshold_db,
+            'max_duration': self.audio_max_duration,
+            'normalize': self.audio_normalize,
+            'target_db': target_db,
+        }
+
+    def _record_postprocess_saving(self, saved: int, dst_path) -> None:
+        """累计静音裁剪/时长截断节省的字节数（不含本地变速带来的大小变化），用于 /vitsinfo 展示。"""
+        try:
+            after = Path(dst_path).stat().st_size
+        except Exception:
+            return
+        self._postprocess_clips += 1
+        self._postprocess_bytes_saved += saved
+        logger.info(f"音频后处理完成：{after + saved} → {after} 字节，节省 {saved} 字节")
+
+    async def _get_base_audio(self, tts_input: str, voice: str, speed: float, gain: float, output_audio_path=None,
+                              priority: int = PRIORITY_GROUP):
+        """获取基础音频路径：启用缓存时从缓存读取或合成后写入缓存，否则直接合成到 output_audio_path。
+
+        本地处理语速/增益时上游只合成中性参数的基础音频，使所有 speed/gain 组合共享同一份缓存。
+        上游请求按 priority 排队调度。
+        """
+        await self._ensure_storage_ready()
+        req_speed, req_gain = (1.0, 0.0) if self._use_local_postprocess() else (speed, gain)
+        backend_name = self._select_backend_name(tts_input, priority)
+
+        async def produce(path):
+            if backend_name == self.tts_backend:
+                async with self._scheduler.slot(priority):
+                    await self._create_speech_request(tts_input, path, req_speed, req_gain, voice)
+            else:
+                # 溢出到本地预置音频，不占用上游并发名额
+                await self._create_speech_request(
+                    tts_input, path, req_speed, req_gain, voice, self._get_backend(backend_name)
+                )
+
+        if not self._audio_cache.enabled:
+            await produce(output_audio_path)
+            return output_audio_path
+
+        key = AudioCache.make_key(backend_name, self.api_url, self.api_name, voice, tts_input, req_speed, req_gain)
+        return await self._audio_cache.get_or_create(key, produce)
+
+    async def _synthesize_audio(self, tts_input: str, output_audio_path: Path, profile=None,
+                                priority: int = PRIORITY_GROUP) -> bool:
+        """合成音频到 output_audio_path：优先复用基础音频缓存，必要时在本地处理语速与增益。
+
+        profile 为 (voice, speed, gain)，缺省时使用全局配置。
+        """
+        voice, speed, gain = profile or (self.api_voice, self.speed, self.gain)
+        local = self._use_local_postprocess()
+        base_path = await self._get_base_audio(tts_input, voice, speed, gain, output_audio_path, priority)
+
+        loop = asyncio.get_running_loop()
+        stage_options = self._audio_stage_options()
+        local_render = local and (speed != 1.0 or gain != 0.0)
+        if local_render or stage_options:
+            render_speed, render_gain = (speed, gain) if local else (1.0, 0.0)
+            render_src = base_path
+            if base_path == output_audio_path:
+                # 未启用缓存时基础音频就写在输出路径上，先挪开作为处理源
+                render_src = Path(str(output_audio_path) + '.src.tmp')
+                os.replace(output_audio_path, render_src)
+            try:
+                saved = await loop.run_in_executor(
+                    self._dsp_executor,
+                    functools.partial(
+                        audio_dsp.render_clip, str(render_src), str(output_audio_path),
+                        render_speed, render_gain, **stage_options,
+                    ),
+                )
+                if stage_options:
+                    self._record_postprocess_saving(saved, output_audio_path)
+                return True
+            except Exception as e:
+                if local_render:
+                    # 非 PCM WAV 等无法本地处理的情况，回退为由 API 直接处理 speed/gain
+                    logger.warning(f"本地音频处理失败，回退为 API 处理: {e}")
+                    async with self._scheduler.slot(priority):
+                        await self._create_speech_request(tts_input, output_audio_path, speed, gain, voice)
+                    return True
+                logger.warning(f"音频后处理失败，发送未处理的音频: {e}")
+                await loop.run_in_executor(self._dsp_executor, shutil.copyfile, str(render_src), str(output_audio_path))
+                return True
+            finally:
+                if render_src != base_path:
+                    try:
+                        os.remove(render_src)
+                    except Exception:
+                        pass
+        if base_path != output_audio_path:
+            await loop.run_in_executor(self._dsp_executor, shutil.copyfile, str(base_path), str(output_audio_path))
+        return True
+
+    def _roll_tts_probability(self) -> bool:
+        """按设置的概率决定本次是否进行TTS转换"""
+        if self.tts_probability < 100:
+            # 生成1-100之间的随机数
+            random_num = random.randint(1, 100)
+            if random_num > self.tts_probability:
+                return False
+        return True
+
+    async def _should_skip_tts(self, text: str, check_probability: bool = True) -> bool:
+        """检查是否应该跳过TTS转换；check_probability=False 时不再做概率判定（已提前判定过）"""
         # 长度阈值检查
         if isinstance(self.max_tts_chars, int) and self.max_tts_chars > 0 and len(text) > self.max_tts_chars:
             return True
         # 检测是否包含跳过TTS的关键词
+        if self._matches_skip_keyword(text):
+            return True
+        
+        # 概率检测：根据设置的概率决定是否进行TTS转换
+        if check_probability and not self._roll_tts_probability():
+            return True
+        
+        return False
+
+    def _is_session_allowed(self, event: AstrMessageEvent) -> bool:
+        """会话访问控制：disabled/whitelist/blacklist，异常时放行。"""
+        try:
+            mode = (self.group_access_mode or 'disabled').lower()
+            if mode not in ['disabled', 'whitelist', 'blacklist']:
+                mode = 'disabled'
+            acl = {str(x).strip() for x in (self.group_access_list or []) if str(x).strip() != ''}
+            group_id = event.get_group_id() if hasattr(event, 'get_group_id') else None
+            sender_id = event.get_sender_id() if hasattr(event, 'get_sender_id') else None
+            ctx_id = str(group_id).strip() if group_id else (str(sender_id).strip() if sender_id else '')
+
+            if mode == 'whitelist':
+                # 仅名单内启用
+                return ctx_id != '' and ctx_id in acl
+            if mode == 'blacklist':
+                # 名单内禁用
+                return not (ctx_id != '' and ctx_id in acl)
+        except Exception:
+            # 任何异常都不应阻断正常流程
+            pass
+        return True
+
+    def _classify_priority(self, event: AstrMessageEvent) -> int:
+        """根据事件推断合成优先级：VIP 会话 > 私聊 > 群聊；非 LLM 的唤醒指令回复视为命令。"""
+        try:
+            group_id = event.get_group_id() if hasattr(event, 'get_group_id') else None
+            if self.vip_sessions:
+                sender_id = event.get_sender_id() if hasattr(event, 'get_sender_id') else None
+                umo = getattr(event, 'unified_msg_origin', None)
+                for ident in (group_id, sender_id, umo):
+                    if ident and str(ident).strip() in self.vip_sessions:
+                        return PRIORITY_VIP
+            if getattr(event, 'is_at_or_wake_command', False) and not event.get_extra('vits_has_llm'):
+                return PRIORITY_COMMAND
+            return PRIORITY_GROUP if group_id else PRIORITY_PRIVATE
+        except Exception:
+            return PRIORITY_GROUP
+
+    def _matches_skip_keyword(self, text: str) -> bool:
+        """文本是否包含跳过TTS的关键词（不区分大小写）"""
         text_lower = text.lower()
         for keyword in self.skip_tts_keywords:
             if keyword in text_lower:
                 return True
-        
-        # 概率检测：根据设置的概率决定是否进行TTS转换
-        if self.tts_probability < 100:
-            # 生成1-100之间的随机数
-            random_num = random.randint(1, 100)
-            if random_num > self.tts_probability:
-                return True
-        
         return False
 
-    def _is_duplicate_request(self, session_key: str, text: str) -> bool:
-        """检查并标记重复请求，避免短时间内相同文本重复TTS"""
+    def _is_duplicate_request(self, session_key: str, text: str, mark: bool = True) -> bool:
+        """检查并标记重复请求，避免短时间内相同文本重复TTS；mark=False 时只查询不标记"""
         try:
             import time
             now = time.time()
@@ -738,13 +1275,14 @@ class VITSPlugin(Star):
             ts = self._recent_tts.get(key)
             if ts and (now - ts) <= self._dedup_ttl_seconds:
                 return True
-            self._recent_tts[key] = now
+            if mark:
+                self._recent_tts[key] = now
             return False
         except Exception:
             return False
 
-    async def _convert_to_speech(self, event: AstrMessageEvent, result, session_key: str):
-        """将文本结果转换为语音"""
+    async def _convert_to_speech(self, event: AstrMessageEvent, result, session_key: str, trace=NULL_TRACE):
+        """将文本结果转换为语音；trace 为请求轨迹记录（未开启录制时为空操作）"""
         # 初始化plain_text变量
         plain_text = ""
         chain = result.chain
@@ -754,6 +1292,7 @@ class VITSPlugin(Star):
         try:
             for comp in chain:
                 if isinstance(comp, Record):
+                    trace.set('skip', 'has_voice')
                     return
         except Exception:
             pass
@@ -761,6 +1300,7 @@ class VITSPlugin(Star):
         for comp in result.chain:
             # 图片 / @ / 回复 等场景跳过语音
             if isinstance(comp, (Image, At, AtAll, Reply)):
+                trace.set('skip', 'media')
                 return  # 静默退出，不添加错误提示
             if isinstance(comp, Plain):
                 # 不再过滤字符，保持文本原样，避免误删 TTS 控制标记
@@ -769,98 +1309,190 @@ class VITSPlugin(Star):
         # 清理首尾空白并校验是否为空
         plain_text = plain_text.strip()
         if not plain_text:
+            trace.set('skip', 'empty')
             return
+        trace.set_text(plain_text)
 
         # 去重：同一会话短时间内相同文本不重复合成
         if self._is_duplicate_request(session_key, plain_text):
+            trace.set('skip', 'duplicate')
             return
 
-        # 检查是否应该跳过TTS
-        if await self._should_skip_tts(plain_text):
+        # 检查是否应该跳过TTS（增量合成模式下概率已在 LLM 回复阶段判定）
+        prob_decided = event.get_extra('vits_prob_decided')
+        skip_reason = None
+        if prob_decided is False:
+            skip_reason = 'probability'
+        elif await self._should_skip_tts(plain_text, check_probability=False):
+            skip_reason = 'filter'
+        elif prob_decided is None and not self._roll_tts_probability():
+            skip_reason = 'probability'
+        if skip_reason is not None:
+            trace.set('skip', skip_reason)
             # 若文本前部包含以 <|endofprompt|> 结尾的提示前缀，剔除后再以文字发送
             self._strip_end_marker_prefix_in_chain(result)
             return
 
-        # 为本次请求生成唯一输出文件，使用临时文件 + 原子替换，并加锁避免并发冲突
+        # 限流：会话或全局令牌不足时退化为文字回复，不进入合成
+        rate_allowed = event.get_extra('vits_rate_allowed')
+        if rate_allowed is None and self.rate_limit_enabled:
+            rate_allowed = self._rate_limiter.allow(session_key)
+        if rate_allowed is False:
+            trace.set('skip', 'rate_limited')
+            self._strip_end_marker_prefix_in_chain(result)
+            return
+
+        # 为本次请求生成唯一输出文件，使用临时文件 + 原子替换，上游请求经调度器排队
         final_audio_path, tmp_audio_path = self._generate_unique_audio_paths()
 
         try:
-            async with self._tts_lock:
-                # 构造用于TTS的输入文本（保留可能的人设前缀）
-                # 优先使用 on_llm_response 缓存的原始文本，避免被其他插件改写
-                src_text = plain_text
+            # 构造用于TTS的输入文本（保留可能的人设前缀）
+            # 优先使用 on_llm_response 缓存的原始文本，避免被其他插件改写
+            src_text = plain_text
+            try:
+                cached = event.get_extra('vits_raw_text')
+                if isinstance(cached, str) and cached.strip():
+                    src_text = cached
+            except Exception:
+                pass
+            tts_input = await self._build_tts_input(src_text)
+            trace.mark('build')
+            # 调试：先发送完整的TTS输入文本
+            if self.debug_tts_input:
                 try:
-                    cached = event.get_extra('vits_raw_text')
-                    if isinstance(cached, str) and cached.strip():
-                        src_text = cached
+                    preview_text = tts_input
+                    # 展示时可限制长度以免过长
+                    if len(preview_text) > 4000:
+                        preview_text = preview_text[:4000] + "..."
+                    result.chain = [Plain(preview_text)]
                 except Exception:
                     pass
-                tts_input = await self._build_tts_input(src_text)
-                # 调试：先发送完整的TTS输入文本
-                if self.debug_tts_input:
-                    try:
-                        preview_text = tts_input
-                        # 展示时可限制长度以免过长
-                        if len(preview_text) > 4000:
-                            preview_text = preview_text[:4000] + "..."
-                        result.chain = [Plain(preview_text)]
-                    except Exception:
-                        pass
-                success = await self._create_speech_request(tts_input, tmp_audio_path)
-            if success:
-                # 原子替换到最终文件（尽量同卷内替换，失败则回退为复制）
+            stream_job = event.get_extra('vits_stream_job')
+            if stream_job is not None:
+                # 由本次转换接管，避免被 _discard_stream_job 取消
+                event.set_extra('vits_stream_job', None)
+                if stream_job.cancelled:
+                    stream_job = None
+            priority = self._classify_priority(event)
+            trace.set('prio', priority)
+            trace.set('stream', stream_job is not None)
+            synthesis = self._render_voice_file(
+                tts_input, tmp_audio_path, final_audio_path,
+                self._resolve_session_profile(session_key), priority, stream_job,
+            )
+            if self.voice_deadline_seconds > 0:
+                # 限时等待：超时则先发文字，语音在后台合成完成后补发
+                started = time.monotonic()
+                task = asyncio.create_task(synthesis)
                 try:
-                    os.replace(tmp_audio_path, final_audio_path)
-                except Exception:
-                    try:
-                        data = Path(tmp_audio_path).read_bytes()
-                        Path(final_audio_path).write_bytes(data)
-                        try:
-                            os.remove(tmp_audio_path)
-                        except Exception:
-                            pass
-                    except Exception:
-                        raise
-                if self.reference_mode or self.debug_tts_input:
-                    # 参考模式：语音 + 原文本（剔除可能存在的前缀）
-                    # 复制原文本
-                    original_text = ''
-                    try:
-                        text_builder = []
-                        for comp in result.chain:
-                            if isinstance(comp, Plain):
-                                text_builder.append(comp.text)
-                        original_text = '\n'.join([t for t in text_builder if t]).strip()
-                    except Exception:
-                        original_text = ''
-                    # 剔除前缀
-                    try:
-                        if original_text:
-                            # 仅匹配标准形式：<|endofprompt|> 后的文本
-                            original_text = re.sub(r"^.*?<\|endofprompt\|>\s*", '', original_text, flags=re.DOTALL)
-                    except Exception:
-                        pass
-                    # 组合为：语音 + 文本
-                    new_chain = [Record(file=str(final_audio_path))]
-                    if original_text:
-                        new_chain.append(Plain(original_text))
-                    result.chain = new_chain
-                else:
-                    # 仅发送语音
-                    result.chain = [Record(file=str(final_audio_path))]
+                    await asyncio.wait_for(asyncio.shield(task), self.voice_deadline_seconds)
+                except asyncio.TimeoutError:
+                    trace.mark('deadline')
+                    trace.set('outcome', 'deferred')
+                    self._strip_end_marker_prefix_in_chain(result)
+                    self._schedule_deferred_voice(task, session_key, started)
+                    return
+            else:
+                await synthesis
+            trace.mark('synth')
+            trace.set('outcome', 'voice')
+            if self.reference_mode or self.debug_tts_input:
+                # 参考模式：语音 + 原文本（剔除可能存在的前缀）
+                # 复制原文本
+                original_text = ''
                 try:
-                    event.set_extra('vits_sent', True)
+                    text_builder = []
+                    for comp in result.chain:
+                        if isinstance(comp, Plain):
+                            text_builder.append(comp.text)
+                    original_text = '\n'.join([t for t in text_builder if t]).strip()
                 except Exception:
-                    pass
-                # 成功后执行一次目录清理，重载不影响
+                    original_text = ''
+                # 剔除前缀
                 try:
-                    self._enforce_audio_retention()
+                    if original_text:
+                        # 仅匹配标准形式：<|endofprompt|> 后的文本
+                        original_text = re.sub(r"^.*?<\|endofprompt\|>\s*", '', original_text, flags=re.DOTALL)
                 except Exception:
                     pass
+                # 组合为：语音 + 文本
+                new_chain = [Record(file=str(final_audio_path))]
+                if original_text:
+                    new_chain.append(Plain(original_text))
+                result.chain = new_chain
+            else:
+                # 仅发送语音
+                result.chain = [Record(file=str(final_audio_path))]
+            try:
+                event.set_extra('vits_sent', True)
+            except Exception:
+                pass
+            # 成功后执行一次目录清理，重载不影响
+            try:
+                self._enforce_audio_retention()
+            except Exception:
+                pass
         except Exception as e:
+            trace.set('outcome', 'error')
             logger.error(f"语音转换失败: {e}")
             chain.append(Plain(f"语音转换失败：{str(e)}"))
 
+    async def _render_voice_file(self, tts_input: str, tmp_audio_path: Path, final_audio_path: Path,
+                                 profile, priority: int, stream_job=None) -> Path:
+        """合成语音并原子替换到最终文件，返回最终路径；stream_job 不为空时拼接增量合成的分句结果。"""
+        if stream_job is not None:
+            # 增量合成：各句已在 LLM 输出阶段提交，这里等待收尾并按顺序拼接
+            stream_job.finish()
+            segment_paths = await stream_job.collect()
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    self._dsp_executor, concat_wavs, segment_paths, tmp_audio_path
+                )
+            finally:
+                for p in segment_paths:
+                    try:
+                        os.remove(p)
+                    except Exception:
+                        pass
+        else:
+            await self._synthesize_audio(tts_input, tmp_audio_path, profile, priority)
+        # 原子替换到最终文件（尽量同卷内替换，失败则回退为复制）
+        try:
+            os.replace(tmp_audio_path, final_audio_path)
+        except Exception:
+            data = Path(tmp_audio_path).read_bytes()
+            Path(final_audio_path).write_bytes(data)
+            try:
+                os.remove(tmp_audio_path)
+            except Exception:
+                pass
+        return final_audio_path
+
+    def _schedule_deferred_voice(self, task: asyncio.Task, umo: str, started: float) -> None:
+        """后台等待超时的合成任务完成，再通过 context.send_message 补发语音；超过过期时间则丢弃。"""
+        async def deliver():
+            try:
+                final_audio_path = await task
+            except Exception as e:
+                logger.warning(f"后台语音合成失败: {e}")
+                return
+            age = time.monotonic() - started
+            if self.voice_stale_seconds > 0 and age > self.voice_stale_seconds:
+                logger.info(f"后台语音已过期（{age:.1f} 秒），不再发送")
+                return
+            try:
+                await self.context.send_message(umo, MessageChain(chain=[Record(file=str(final_audio_path))]))
+            except Exception as e:
+                logger.warning(f"补发语音失败: {e}")
+            try:
+                self._enforce_audio_retention()
+            except Exception:
+                pass
+
+        deferred = asyncio.create_task(deliver())
+        self._deferred_voice_tasks.add(deferred)
+        deferred.add_done_callback(self._deferred_voice_tasks.discard)
+
     @filter.command("ttsmax", priority=1)
     async def set_max_saved_audios_cmd(self, event: AstrMessageEvent):
         """设置最大保存音频文件数量（0=不限制）。用法：/ttsmax <数量>。"""
@@ -886,6 +1518,142 @@ class VITSPlugin(Star):
         except ValueError:
             yield event.plain_result("请输入有效数字，例如：/ttsmax 200")
 
+    @filter.command("vitsqueue", priority=1)
+    async def vits_queue(self, event: AstrMessageEvent):
+        """查看合成调度队列：各优先级的排队数与等待/耗时统计"""
+        text = "合成调度状态：\n" + self._scheduler.stats_text()
+        if self.local_overflow_queue_depth > 0:
+            text += f"\n溢出到本地预置音频：{self._local_overflow_count} 次（排队达到 {self.local_overflow_queue_depth} 时）"
+        yield event.plain_result(text)
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("vitsbatch", priority=1)
+    async def vits_batch(self, event: AstrMessageEvent):
+        """批量预合成音频写入缓存（管理员）。用法：/vitsbatch <文件路径> [并发数]"""
+        parts = event.get_message_str().strip().split()
+        if len(parts) < 2:
+            yield event.plain_result(
+                "用法：/vitsbatch <文件路径> [并发数]\n"
+                "文件为 .txt（每行一段文本）或 .jsonl；相对路径基于插件数据目录。\n"
+                "结果写入音频缓存，中断后重新执行会从检查点继续。"
+            )
+            return
+        if self._batch_task is not None and not self._batch_task.done():
+            yield event.plain_result("已有批量合成任务在运行，请等待完成后再试。")
+            return
+        input_path = Path(parts[1])
+        if not input_path.is_absolute():
+            input_path = Path(self.plugin_data_dir) / input_path
+        if not input_path.exists():
+            yield event.plain_result(f"文件不存在：{input_path}")
+            return
+        concurrency = self.batch_concurrency
+        if len(parts) >= 3:
+            try:
+                concurrency = max(1, int(parts[2]))
+            except ValueError:
+                yield event.plain_result("并发数需为正整数，例如：/vitsbatch lines.txt 4")
+                return
+        umo = getattr(event, 'unified_msg_origin', None) or event.get_session_id()
+        self._batch_task = asyncio.create_task(self._run_batch_job(umo, input_path, concurrency))
+        yield event.plain_result(f"已开始批量合成：{input_path.name}（并发 {concurrency}），完成后会在此通知。")
+
+    async def _run_batch_job(self, umo: str, input_path: Path, concurrency: int):
+        """后台执行批量合成，结束后把统计结果发回发起命令的会话。"""
+        try:
+            stats = await run_batch(self, input_path, concurrency, self.batch_retries)
+            message = format_batch_stats(stats)
+        except Exception as e:
+            logger.error(f"批量合成失败: {e}")
+            message = f"批量合成失败：{e}"
+        try:
+            await self.context.send_message(umo, MessageChain(chain=[Plain(message)]))
+        except Exception as e:
+            logger.warning(f"发送批量合成结果失败: {e}")
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("vitsprof", priority=1)
+    async def vits_prof(self, event: AstrMessageEvent):
+        """按需性能剖析（管理员）。用法：/vitsprof <秒数|N条> [cprofile|sample]，/vitsprof stop 提前结束"""
+        parts = event.get_message_str().strip().split()
+        if len(parts) < 2:
+            status = "当前没有进行中的剖析。"
+            session = self._profile_session
+            if session is not None:
+                status = (
+                    f"剖析进行中：{session.mode}，已进行 {time.monotonic() - session.started:.0f} 秒，"
+                    f"已处理 {session.messages_seen} 条消息。"
+                )
+            yield event.plain_result(
+                "用法：/vitsprof <秒数|N条> [cprofile|sample]\n"
+                "示例：/vitsprof 30（剖析 30 秒）、/vitsprof 20条 sample（采样接下来 20 条回复）、/vitsprof stop\n"
+                f"结果保存在插件数据目录 profiles/ 下，单次最长 {PROFILE_MAX_SECONDS} 秒。\n" + status
+            )
+            return
+        if parts[1].lower() == 'stop':
+            if self._profile_session is None:
+                yield event.plain_result("当前没有进行中的剖析。")
+                return
+            yield event.plain_result(await self._finish_profile(self._profile_session))
+            return
+        if self._profile_session is not None:
+            yield event.plain_result("已有剖析在进行中，可使用 /vitsprof stop 提前结束。")
+            return
+        m = re.fullmatch(r"(\d+)\s*(秒|s|条|msg)?", parts[1].lower())
+        mode = parts[2].lower() if len(parts) >= 3 else 'cprofile'
+        if not m or int(m.group(1)) <= 0 or mode not in ('cprofile', 'sample'):
+            yield event.plain_result("参数错误，示例：/vitsprof 30 或 /vitsprof 20条 sample")
+            return
+        amount = int(m.group(1))
+        by_messages = m.group(2) in ('条', 'msg')
+        seconds = PROFILE_MAX_SECONDS if by_messages else min(amount, PROFILE_MAX_SECONDS)
+        suffix = '.collapsed' if mode == 'sample' else '.pstats'
+        name = f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}{suffix}"
+        output_path = Path(self.plugin_data_dir) / "profiles" / name
+        session = ProfileSession(mode, output_path, seconds=seconds, messages=amount if by_messages else 0)
+        try:
+            session.start()
+        except ValueError as e:
+            yield event.plain_result(f"无法开启剖析（可能已有其他剖析工具在运行）：{e}")
+            return
+        self._profile_session = session
+        self._profile_umo = getattr(event, 'unified_msg_origin', None) or event.get_session_id()
+        self._profile_task = asyncio.create_task(self._run_profile_timer(session))
+        target = f"接下来 {amount} 条回复" if by_messages else f"{seconds} 秒"
+        yield event.plain_result(f"已开始剖析（{mode}，{target}），完成后会在此发送热点摘要。")
+
+    async def _run_profile_timer(self, session: ProfileSession):
+        """等待剖析达到时长或条数，结束后把摘要发回发起命令的会话。"""
+        try:
+            await asyncio.wait_for(session.reached.wait(), session.seconds)
+        except asyncio.TimeoutError:
+            pass
+        message = await self._finish_profile(session)
+        if not message:
+            return
+        try:
+            await self.context.send_message(self._profile_umo, MessageChain(chain=[Plain(message)]))
+        except Exception as e:
+            logger.warning(f"发送剖析结果失败: {e}")
+
+    async def _finish_profile(self, session: ProfileSession) -> str:
+        """停止剖析并保存结果，返回摘要；session 已结束时返回空字符串。"""
+        if self._profile_session is not session:
+            return ''
+        self._profile_session = None
+        session.stop()
+        session.reached.set()
+        try:
+            summary = await asyncio.to_thread(session.save)
+        except Exception as e:
+            logger.error(f"保存剖析结果失败: {e}")
+            return f"保存剖析结果失败：{e}"
+        logger.info(f"性能剖析结果已保存: {session.output_path}")
+        return (
+            f"剖析完成（{session.mode}，{session.elapsed:.1f} 秒，{session.messages_seen} 条回复），"
+            f"结果已保存：{session.output_path}\n{summary}"
+        )
+
     @filter.on_decorating_result(priority=-100)
     async def on_decorating_result(self, event: AstrMessageEvent):
         # 插件是否启用
@@ -900,32 +1668,11 @@ class VITSPlugin(Star):
             return
 
         # 会话访问控制：disabled/whitelist/blacklist
-        try:
-            mode = (self.group_access_mode or 'disabled').lower()
-            if mode not in ['disabled', 'whitelist', 'blacklist']:
-                mode = 'disabled'
-            acl = {str(x).strip() for x in (self.group_access_list or []) if str(x).strip() != ''}
-            group_id = event.get_group_id() if hasattr(event, 'get_group_id') else None
-            sender_id = event.get_sender_id() if hasattr(event, 'get_sender_id') else None
-            ctx_id = str(group_id).strip() if group_id else (str(sender_id).strip() if sender_id else '')
-
-            if mode == 'whitelist':
-                # 仅名单内启用
-                if ctx_id == '' or ctx_id not in acl:
-                    result = event.get_result()
-                    if result is not None:
-                        self._strip_end_marker_prefix_in_chain(result)
-                    return
-            elif mode == 'blacklist':
-                # 名单内禁用
-                if ctx_id != '' and ctx_id in acl:
-                    result = event.get_result()
-                    if result is not None:
-                        self._strip_end_marker_prefix_in_chain(result)
-                    return
-        except Exception:
-            # 任何异常都不应阻断正常流程
-            pass
+        if not self._is_session_allowed(event):
+            result = event.get_result()
+            if result is not None:
+                self._strip_end_marker_prefix_in_chain(result)
+            return
         try:
             if event.get_extra('vits_processed'):
                 if event.get_extra('vits_sent'):
@@ -948,4 +1695,38 @@ class VITSPlugin(Star):
             pass
         # 传递会话键，用于去重
         session_key = getattr(event, 'unified_msg_origin', None) or event.get_session_id()
-        await self._convert_to_speech(event, result, session_key)
+        trace = self._tracer.start(session_key) if self._tracer is not None else NULL_TRACE
+        try:
+            await self._convert_to_speech(event, result, session_key, trace)
+        finally:
+            self._discard_stream_job(event)
+            if self._tracer is not None:
+                self._tracer.write(trace)
+            if self._profile_session is not None:
+                self._profile_session.message_done()
+
+    async def terminate(self):
+        """插件卸载/重载时停止启动、剖析、批量与补发任务，释放线程池与后端连接。"""
+        if self._startup_task is not None and not self._startup_task.done():
+            self._startup_task.cancel()
+        if self._profile_session is not None:
+            self._profile_session.stop()
+            self._profile_session = None
+        if self._profile_task is not None and not self._profile_task.done():
+            self._profile_task.cancel()
+        if self._batch_task is not None and not self._batch_task.done():
+            self._batch_task.cancel()
+        for task in list(self._deferred_voice_tasks):
+            task.cancel()
+        try:
+            self._dsp_executor.shutdown(wait=False)
+        except Exception:
+            pass
+        for backend in list(self._backends.values()):
+            try:
+                await backend.close()
+            except Exception:
+                pass
+        self._backends.clear()
+        if self._tracer is not None:
+            self._tracer.close()
@@ -0,0 +1,147 @@
+"""运行时性能剖析：由管理员命令 /vitsprof 按需开启，结束后保存结果并生成热点函数摘要。
+
+两种模式：
+- cprofile：在事件循环线程上开启 cProfile，结果保存为 .pstats（可用 snakeviz / pstats 查看）。
+  协程每次从 await 恢复都会计为一次调用，调用次数偏大；耗时只统计实际占用事件循环的 CPU 时间。
+- sample：后台线程按固定间隔采样事件循环线程的调用栈，结果保存为 .collapsed（可直接用 flamegraph.pl / speedscope 打开）。
+
+未开启剖析时热路径上只有一次 `is None` 判断；线程池中的 DSP 计算不在剖析范围内。
+"""
+from collections import Counter
+from pathlib import Path
+import asyncio
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+
+PLUGIN_DIR = str(Path(__file__).parent)
+# 单次剖析的最长时间（秒），按条数剖析时也以此为超时
+MAX_SECONDS = 600
+# 采样时视为事件循环空闲的栈顶帧
+_IDLE_LEAF = 'select (selectors.py:'
+
+
+class ProfileSession:
+    def __init__(self, mode: str, output_path, seconds: float = 0.0, messages: int = 0,
+                 interval: float = 0.005, top: int = 8):
+        self.mode = mode
+        self.output_path = Path(output_path)
+        self.seconds = seconds
+        self.messages = messages
+        self.interval = interval
+        self.top = top
+        self.messages_seen = 0
+        self.reached = asyncio.Event()  # 按条数剖析达到目标，或被提前停止
+        self.started = 0.0
+        self.elapsed = 0.0
+        self._profiler = None
+        self._sampler = None
+        self._stopping = threading.Event()
+        self._target_thread = None
+        self._stacks = Counter()
+        self._leaf = Counter()
+        self._plugin_inclusive = Counter()
+        self._samples = 0
+        self._idle = 0
+
+    def start(self) -> None:
+        """在事件循环线程中调用。"""
+        self.started = time.monotonic()
+        if self.mode == 'sample':
+            self._target_thread = threading.get_ident()
+            self._sampler = threading.Thread(target=self._sample_loop, name="vits_profiler", daemon=True)
+            self._sampler.start()
+        else:
+            profiler = cProfile.Profile()
+            # 已有其他剖析工具在运行时会抛出 ValueError，由调用方提示
+            profiler.enable()
+            self._profiler = profiler
+
+    def stop(self) -> None:
+        """停止采集（在事件循环线程中调用）。"""
+        self.elapsed = time.monotonic() - self.started
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._stopping.set()
+            self._sampler.join(timeout=1.0)
+
+    def message_done(self) -> None:
+        """记录一条已处理的消息，达到按条数剖析的目标时置位 reached。"""
+        self.messages_seen += 1
+        if self.messages > 0 and self.messages_seen >= self.messages:
+            self.reached.set()
+
+    def _sample_loop(self) -> None:
+        while not self._stopping.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread)
+            if frame is None:
+                continue
+            stack = []
+            plugin_labels = set()
+            while frame is not None:
+                code = frame.f_code
+                label = f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+                stack.append(label)
+                if code.co_filename.startswith(PLUGIN_DIR):
+                    plugin_labels.add(label)
+                frame = frame.f_back
+            stack.reverse()
+            self._stacks[';'.join(stack)] += 1
+            if stack[-1].startswith(_IDLE_LEAF):
+                # 事件循环在等待 I/O，挂起中的协程不在线程栈上
+                self._idle += 1
+            else:
+                self._leaf[stack[-1]] += 1
+            self._plugin_inclusive.update(plugin_labels)
+            self._samples += 1
+
+    def save(self) -> str:
+        """保存结果文件并返回热点摘要；耗时操作，应放到线程中执行。"""
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.mode == 'sample':
+            with open(self.output_path, 'w', encoding='utf-8') as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            return self._sample_summary()
+        self._profiler.dump_stats(str(self.output_path))
+        return self._cprofile_summary()
+
+    def _sample_summary(self) -> str:
+        if not self._samples:
+            return "未采到样本"
+        lines = [
+            f"共 {self._samples} 个样本（间隔 {self.interval * 1000:.0f}ms），事件循环空闲 {self._idle / self._samples:.1%}",
+            "插件函数（含子调用占比）：",
+        ]
+        for label, count in self._plugin_inclusive.most_common(self.top):
+            lines.append(f"  {count / self._samples:6.1%}  {label}")
+        lines.append("栈顶函数（自身占比）：")
+        for label, count in self._leaf.most_common(self.top):
+            lines.append(f"  {count / self._samples:6.1%}  {label}")
+        return "\n".join(lines)
+
+    def _cprofile_summary(self) -> str:
+        stats = pstats.Stats(self._profiler, stream=io.StringIO()).stats
+        if not stats:
+            return "未采到调用"
+
+        def label(func):
+            filename, line, name = func
+            return f"{name} ({Path(filename).name}:{line})" if line else name
+
+        plugin = [(func, v) for func, v in stats.items() if func[0].startswith(PLUGIN_DIR)]
+        plugin.sort(key=lambda item: item[1][3], reverse=True)
+        lines = ["插件函数（按累计耗时）："]
+        for func, (_, nc, tt, ct, _) in plugin[:self.top]:
+            lines.append(f"  {ct * 1000:8.1f}ms 累计 {tt * 1000:8.1f}ms 自身 {nc:6d} 次  {label(func)}")
+        # 排除事件循环等待 I/O 的 select/epoll 调用
+        overall = [(func, v) for func, v in stats.items() if "of 'select." not in func[2]]
+        overall.sort(key=lambda item: item[1][2], reverse=True)
+        lines.append("全部函数（按自身耗时，不含等待 I/O）：")
+        for func, (_, nc, tt, ct, _) in overall[:self.top]:
+            lines.append(f"  {tt * 1000:8.1f}ms 自身 {nc:6d} 次  {label(func)}")
+        return "\n".join(lines)
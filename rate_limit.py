@@ -0,0 +1,69 @@
+"""令牌桶限流：每个会话一个桶，外加一个全局桶。
+
+桶按需惰性补充令牌（不依赖定时器），会话桶存放在按最近使用排序的 OrderedDict 中，
+超过 max_sessions 时淘汰最久未活动的会话，单次检查为摊还 O(1)。
+"""
+from collections import OrderedDict
+import time
+
+
+class RateLimiter:
+    def __init__(self, session_rate_per_minute: float, session_burst: float,
+                 global_rate_per_minute: float, global_burst: float, max_sessions: int = 10000):
+        # 速率换算为每秒补充的令牌数；速率 <= 0 表示该层级不限流
+        self.session_rate = max(0.0, float(session_rate_per_minute)) / 60.0
+        self.session_burst = max(1.0, float(session_burst))
+        self.global_rate = max(0.0, float(global_rate_per_minute)) / 60.0
+        self.global_burst = max(1.0, float(global_burst))
+        self.max_sessions = max(1, int(max_sessions))
+        self._sessions = OrderedDict()  # session_key -> [令牌数, 上次补充时间]
+        self._global = [self.global_burst, time.monotonic()]
+        self.allowed = 0
+        self.limited = 0
+
+    @staticmethod
+    def _refill(bucket: list, rate: float, burst: float, now: float) -> float:
+        tokens = bucket[0] + (now - bucket[1]) * rate
+        if tokens > burst:
+            tokens = burst
+        bucket[0] = tokens
+        bucket[1] = now
+        return tokens
+
+    def allow(self, session_key: str) -> bool:
+        """会话桶与全局桶都有令牌时各扣 1 个并返回 True，否则不扣并返回 False。"""
+        now = time.monotonic()
+        session_bucket = None
+        if self.session_rate > 0:
+            session_bucket = self._sessions.get(session_key)
+            if session_bucket is None:
+                session_bucket = [self.session_burst, now]
+                self._sessions[session_key] = session_bucket
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_key)
+            if self._refill(session_bucket, self.session_rate, self.session_burst, now) < 1.0:
+                self.limited += 1
+                return False
+        if self.global_rate > 0:
+            if self._refill(self._global, self.global_rate, self.global_burst, now) < 1.0:
+                self.limited += 1
+                return False
+            self._global[0] -= 1.0
+        if session_bucket is not None:
+            session_bucket[0] -= 1.0
+        self.allowed += 1
+        return True
+
+    def refund(self, session_key: str) -> None:
+        """归还一次 allow 扣除的令牌，用于放行后最终没有合成的请求。"""
+        bucket = self._sessions.get(session_key)
+        if self.session_rate > 0 and bucket is not None:
+            bucket[0] = min(self.session_burst, bucket[0] + 1.0)
+        if self.global_rate > 0:
+            self._global[0] = min(self.global_burst, self._global[0] + 1.0)
+        self.allowed -= 1
+
+    def stats_text(self) -> str:
+        return f"放行 {self.allowed} 次，限流 {self.limited} 次，跟踪会话 {len(self._sessions)} 个"
@@ -0,0 +1,122 @@
+"""增量合成：在 LLM 流式分片逐段到达时按句切分，每凑满一句立即提交合成，最后按顺序拼接。
+
+合成与生成重叠进行，端到端耗时约为 LLM 生成时间 + 最后一句的合成时间。
+"""
+import asyncio
+import re
+import wave
+
+# 句末标点（含其后的右引号/括号）；英文句点仅在后接空白时视为句末，避免切断小数
+_SENTENCE_END = re.compile(r"[。！？!?；;…～\n]+[”’」』）)\"']*|\.(?=\s)")
+_PREFIX = re.compile(r"^\s*(.*?<\|endofprompt\|>)", re.DOTALL)
+
+
+class SentenceSegmenter:
+    """按句末标点切分增量文本；过短的句子与后文合并，直到不少于 min_chars 个字符。"""
+
+    def __init__(self, min_chars: int = 6):
+        self.min_chars = max(1, int(min_chars))
+        self._buffer = ''
+        self._pending = ''
+
+    def feed(self, delta: str) -> list:
+        self._buffer += delta
+        sentences = []
+        start = 0
+        for m in _SENTENCE_END.finditer(self._buffer):
+            self._pending += self._buffer[start:m.end()]
+            start = m.end()
+            if len(self._pending.strip()) >= self.min_chars:
+                sentences.append(self._pending.strip())
+                self._pending = ''
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> list:
+        rest = (self._pending + self._buffer).strip()
+        self._pending = ''
+        self._buffer = ''
+        return [rest] if rest else []
+
+
+class IncrementalSynthesis:
+    """一次回复的增量合成任务。
+
+    synthesize(text) 为协程函数，返回该句音频文件路径；每句一个 asyncio 任务，collect() 按原顺序返回结果。
+    首句若带有以 <|endofprompt|> 结尾的指令前缀，会同样加到后续每一句前，保持情绪/风格一致。
+    """
+
+    def __init__(self, synthesize, min_chars: int = 6):
+        self._synthesize = synthesize
+        self._segmenter = SentenceSegmenter(min_chars)
+        self._tasks = []
+        self._prefix = ''
+        self.text = ''
+        self.finished = False
+        self.cancelled = False
+
+    def feed(self, delta: str) -> None:
+        if self.cancelled or self.finished or not delta:
+            return
+        self.text += delta
+        for sentence in self._segmenter.feed(delta):
+            self._start(sentence)
+
+    def finish(self) -> None:
+        if self.cancelled or self.finished:
+            return
+        for sentence in self._segmenter.flush():
+            self._start(sentence)
+        self.finished = True
+
+    def _start(self, sentence: str) -> None:
+        if not self._tasks:
+            m = _PREFIX.match(sentence)
+            if m:
+                self._prefix = m.group(1)
+                sentence = sentence[m.end():].strip()
+                if not sentence:
+                    return
+        self._tasks.append(asyncio.create_task(self._synthesize(self._prefix + sentence)))
+
+    @property
+    def segment_count(self) -> int:
+        return len(self._tasks)
+
+    async def collect(self) -> list:
+        """等待全部句子合成完成，按顺序返回音频路径；任一句失败则取消其余并抛出异常。"""
+        try:
+            return list(await asyncio.gather(*self._tasks))
+        except BaseException:
+            self.cancel()
+            raise
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+
+
+def concat_wavs(paths, output_path) -> None:
+    """按顺序拼接多个参数一致的 PCM WAV 文件；先打开并校验全部输入，再创建输出文件。"""
+    readers = []
+    try:
+        for path in paths:
+            readers.append(wave.open(str(path), 'rb'))
+        if not readers:
+            raise ValueError("没有可拼接的分句音频")
+        params = (readers[0].getnchannels(), readers[0].getsampwidth(), readers[0].getframerate())
+        for wf in readers[1:]:
+            current = (wf.getnchannels(), wf.getsampwidth(), wf.getframerate())
+            if current != params:
+                raise ValueError(f"分句音频格式不一致，无法拼接: {current} != {params}")
+        with wave.open(str(output_path), 'wb') as out:
+            out.setnchannels(params[0])
+            out.setsampwidth(params[1])
+            out.setframerate(params[2])
+            for wf in readers:
+                out.writeframes(wf.readframes(wf.getnframes()))
+    finally:
+        for wf in readers:
+            wf.close()
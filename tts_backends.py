@@ -0,0 +1,181 @@
+"""TTS 后端：把一次合成拆成 构建请求 → 传输 → 处理结果 三步，便于在调度器后挂接多种引擎。
+
+- OpenAICompatibleBackend：通用 OpenAI 兼容 /audio/speech 接口
+- SiliconFlowBackend：硅基流动接口（在 OpenAI 兼容格式上额外支持 gain）
+- LocalTTSBackend：本地替身引擎，按文本哈希读取预置音频文件，找不到时生成正弦波占位音频，
+  可完全离线运行插件与性能测试，也可承接上游繁忙时的低优先级流量
+"""
+from abc import ABC, abstractmethod
+from array import array
+from pathlib import Path
+import asyncio
+import hashlib
+import math
+import shutil
+import wave
+
+
+class TTSBackend(ABC):
+    """后端基类。子类实现 build_request / transport / handle_result。"""
+
+    name = 'base'
+
+    @abstractmethod
+    def build_request(self, text: str, voice: str, speed: float, gain: float) -> dict:
+        """把合成参数转换为后端请求。"""
+
+    @abstractmethod
+    async def transport(self, request: dict):
+        """发送请求并返回原始响应。"""
+
+    @abstractmethod
+    async def handle_result(self, response, output_path: Path) -> None:
+        """校验响应并把音频写入 output_path。"""
+
+    async def synthesize(self, text: str, output_path: Path, voice: str = '', speed: float = 1.0, gain: float = 0.0) -> None:
+        """合成 text 并写入 output_path，失败时抛出异常。"""
+        request = self.build_request(text, voice, speed, gain)
+        response = await self.transport(request)
+        await self.handle_result(response, output_path)
+
+    async def close(self) -> None:
+        pass
+
+
+class OpenAICompatibleBackend(TTSBackend):
+    """OpenAI 兼容的 /audio/speech 接口，复用同一个 aiohttp 会话以保持连接；不支持 gain 参数。"""
+
+    name = 'openai'
+
+    def __init__(self, api_url: str, api_key: str, model: str, response_format: str = 'wav'):
+        self.api_url = (api_url or '').rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.response_format = response_format
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    def build_request(self, text: str, voice: str, speed: float, gain: float) -> dict:
+        payload = {
+            "model": self.model,
+            "input": text,
+            "response_format": self.response_format,
+        }
+        if voice:
+            payload["voice"] = voice
+        if speed != 1.0:
+            payload["speed"] = speed
+        return {
+            "url": f"{self.api_url}/audio/speech",
+            "headers": {
+                'Content-Type': 'application/json',
+                'Authorization': f"Bearer {self.api_key}",
+            },
+            "json": payload,
+        }
+
+    async def transport(self, request: dict):
+        session = self._get_session()
+        return await session.post(request["url"], json=request["json"], headers=request["headers"])
+
+    async def handle_result(self, response, output_path: Path) -> None:
+        async with response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise Exception(f"API请求失败，状态码: {response.status}, 错误信息: {error_text}")
+            # 将响应内容写入文件
+            with open(output_path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(8192):
+                    f.write(chunk)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class SiliconFlowBackend(OpenAICompatibleBackend):
+    """硅基流动接口：在 OpenAI 兼容请求上附加 gain 参数。"""
+
+    name = 'siliconflow'
+
+    def build_request(self, text: str, voice: str, speed: float, gain: float) -> dict:
+        request = super().build_request(text, voice, speed, gain)
+        if gain != 0.0:
+            request["json"]["gain"] = gain
+        return request
+
+
+class LocalTTSBackend(TTSBackend):
+    """本地替身引擎：不访问网络。
+
+    若配置了 audio_dir 且其中存在 <文本sha1>.wav，则直接复制该文件；
+    否则生成一段时长与文本长度成正比的正弦波，音高由音色决定。
+    latency 可模拟上游耗时，便于离线压测调度与缓存策略。
+    """
+
+    name = 'local'
+
+    def __init__(self, audio_dir: str = '', latency: float = 0.0, sample_rate: int = 24000, chars_per_second: float = 5.0):
+        self.audio_dir = Path(audio_dir) if audio_dir else None
+        self.latency = max(0.0, float(latency))
+        self.sample_rate = int(sample_rate)
+        self.chars_per_second = float(chars_per_second)
+
+    def clip_path(self, text: str):
+        """返回 audio_dir 中与 text 对应的预置音频路径，不存在时返回 None。"""
+        if self.audio_dir is None:
+            return None
+        candidate = self.audio_dir / f"{hashlib.sha1(text.encode('utf-8')).hexdigest()}.wav"
+        return candidate if candidate.exists() else None
+
+    def build_request(self, text: str, voice: str, speed: float, gain: float) -> dict:
+        source = self.clip_path(text)
+        duration = min(30.0, max(0.3, len(text) / self.chars_per_second)) / max(0.25, speed)
+        # 不同音色使用不同音高，便于试听区分
+        voice_hash = int(hashlib.sha1((voice or '').encode('utf-8')).hexdigest()[:4], 16)
+        return {
+            "source": source,
+            "duration": duration,
+            "frequency": 180.0 + voice_hash % 240,
+            "amplitude": min(1.0, 0.3 * 10.0 ** (gain / 20.0)),
+        }
+
+    async def transport(self, request: dict):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        return request
+
+    async def handle_result(self, response, output_path: Path) -> None:
+        if response["source"] is not None:
+            await asyncio.to_thread(shutil.copyfile, response["source"], output_path)
+        else:
+            await asyncio.to_thread(
+                self._write_tone, output_path, response["duration"], response["frequency"], response["amplitude"]
+            )
+
+    def _write_tone(self, output_path, duration: float, frequency: float, amplitude: float) -> None:
+        n = int(self.sample_rate * duration)
+        step = 2.0 * math.pi * frequency / self.sample_rate
+        peak = 32767.0 * amplitude
+        samples = array('h', (int(peak * math.sin(step * i)) for i in range(n)))
+        with wave.open(str(output_path), 'wb') as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.sample_rate)
+            wf.writeframes(samples.tobytes())
+
+
+def create_backend(name: str, api_url: str = '', api_key: str = '', model: str = '',
+                   local_audio_dir: str = '', local_latency: float = 0.0) -> TTSBackend:
+    """按名称创建后端，未知名称回退为硅基流动。"""
+    if name == 'openai':
+        return OpenAICompatibleBackend(api_url, api_key, model)
+    if name == 'local':
+        return LocalTTSBackend(local_audio_dir, local_latency)
+    return SiliconFlowBackend(api_url, api_key, model)
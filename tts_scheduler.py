@@ -0,0 +1,143 @@
+"""合成任务调度：按优先级分配有限的上游并发名额，替代原先的单一全局锁。
+
+每个优先级一个 FIFO 队列；分派时比较各队首的有效优先级 = 基础优先级 - 等待秒数 / aging_seconds，
+即每等待 aging_seconds 秒提升一级，低优先级任务不会被持续饿死。分派代价为 O(优先级数)。
+"""
+from collections import deque
+import asyncio
+import time
+
+PRIORITY_COMMAND = 0
+PRIORITY_VIP = 1
+PRIORITY_PRIVATE = 2
+PRIORITY_GROUP = 3
+PRIORITY_BATCH = 4
+
+PRIORITY_NAMES = {
+    PRIORITY_COMMAND: '命令',
+    PRIORITY_VIP: 'VIP',
+    PRIORITY_PRIVATE: '私聊',
+    PRIORITY_GROUP: '群聊',
+    PRIORITY_BATCH: '批量',
+}
+
+
+class _ClassStats:
+    __slots__ = ('completed', 'wait_total', 'wait_max', 'run_total')
+
+    def __init__(self):
+        self.completed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+
+
+class _Slot:
+    """async with scheduler.slot(priority): 期间占用一个并发名额。"""
+
+    __slots__ = ('_scheduler', '_priority', '_started')
+
+    def __init__(self, scheduler, priority: int):
+        self._scheduler = scheduler
+        self._priority = priority
+        self._started = 0.0
+
+    async def __aenter__(self):
+        await self._scheduler.acquire(self._priority)
+        self._started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._scheduler.stats[self._priority].run_total += time.monotonic() - self._started
+        self._scheduler.release()
+        return False
+
+
+class TTSScheduler:
+    def __init__(self, max_concurrency: int = 1, aging_seconds: float = 5.0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.aging_seconds = max(0.1, float(aging_seconds))
+        self._queues = {p: deque() for p in PRIORITY_NAMES}
+        self._active = 0
+        self.stats = {p: _ClassStats() for p in PRIORITY_NAMES}
+
+    def slot(self, priority: int) -> _Slot:
+        return _Slot(self, priority if priority in self._queues else PRIORITY_GROUP)
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def acquire(self, priority: int) -> None:
+        enqueued = time.monotonic()
+        if self._active < self.max_concurrency and self.queued == 0:
+            self._active += 1
+            self._record_wait(priority, 0.0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (enqueued, future)
+        self._queues[priority].append(entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已分到名额但调用方被取消，归还名额
+                self.release()
+            else:
+                try:
+                    self._queues[priority].remove(entry)
+                except ValueError:
+                    pass
+            raise
+        self._record_wait(priority, time.monotonic() - enqueued)
+
+    def release(self) -> None:
+        self._active -= 1
+        self._dispatch()
+
+    def _record_wait(self, priority: int, waited: float) -> None:
+        stats = self.stats[priority]
+        stats.completed += 1
+        stats.wait_total += waited
+        if waited > stats.wait_max:
+            stats.wait_max = waited
+
+    def _dispatch(self) -> None:
+        while self._active < self.max_concurrency:
+            future = self._pop_next()
+            if future is None:
+                return
+            self._active += 1
+            future.set_result(None)
+
+    def _pop_next(self):
+        """取出有效优先级最高（数值最小）的队首任务，跳过已取消的。"""
+        now = time.monotonic()
+        best_queue = None
+        best_score = 0.0
+        for priority, queue in self._queues.items():
+            while queue and queue[0][1].done():
+                queue.popleft()
+            if not queue:
+                continue
+            score = priority - (now - queue[0][0]) / self.aging_seconds
+            if best_queue is None or score < best_score:
+                best_queue, best_score = queue, score
+        if best_queue is None:
+            return None
+        return best_queue.popleft()[1]
+
+    def stats_text(self) -> str:
+        lines = [f"并发上限 {self.max_concurrency}，执行中 {self._active}，排队 {self.queued}"]
+        for priority, name in PRIORITY_NAMES.items():
+            stats = self.stats[priority]
+            depth = len(self._queues[priority])
+            if stats.completed == 0 and depth == 0:
+                continue
+            avg_wait = stats.wait_total / stats.completed * 1000 if stats.completed else 0.0
+            avg_run = stats.run_total / stats.completed * 1000 if stats.completed else 0.0
+            lines.append(
+                f"{name}：排队 {depth}，已调度 {stats.completed}，平均等待 {avg_wait:.0f}ms，"
+                f"最长等待 {stats.wait_max * 1000:.0f}ms，平均耗时 {avg_run:.0f}ms"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,309 @@
+"""流量录制与回放：记录线上语音请求的匿名化轨迹，并在本地替身后端上按原节奏回放。
+
+录制（trace_enabled）：每条经过 _convert_to_speech 的回复写一行 JSON，字段为
+- ts：到达时间（Unix 秒）；session / text：会话与文本的带密钥哈希（密钥仅存于内存，轨迹中不含原文）
+- len：文本长度；prio：合成优先级；stream：是否走增量合成
+- skip：跳过原因（has_voice/media/empty/duplicate/filter/probability/rate_limited），未跳过为 null
+- outcome：voice/deferred/error/skip；stages：各阶段相对到达时刻的毫秒数（build/synth/deadline/total）
+
+回放：按轨迹中的到达间隔（可加速）把请求重新送入插件的 _convert_to_speech，后端固定为本地替身引擎，
+文本按哈希与长度确定性生成（相同哈希得到相同文本，缓存/去重行为与线上一致），用于比较调度、缓存与并发配置。
+在 AstrBot 根目录下运行：
+
+    python -m data.plugins.astrbot_plugin_VITS_pro.tts_trace trace.jsonl --speed 10 --set tts_max_concurrency=2
+
+加速回放时上游耗时同比缩短，但限流、优先级老化、去重与限时回复仍按真实时间计算。
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from astrbot.api import logger
+
+# 由文本内容决定、回放时无法复现的跳过原因：这类请求只计数，不再送入插件
+_CONTENT_SKIPS = ('has_voice', 'media', 'empty')
+# 回放时按“概率未命中”处理的跳过原因（关键词/长度过滤依赖原文，只能沿用录制时的结论）
+_DECIDED_SKIPS = ('filter', 'probability')
+
+
+class _NullTrace:
+    """未开启录制时使用的空记录，所有方法均为空操作。"""
+
+    __slots__ = ()
+
+    def set_text(self, text: str) -> None:
+        pass
+
+    def set(self, key: str, value) -> None:
+        pass
+
+    def mark(self, stage: str) -> None:
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class TraceRecord:
+    __slots__ = ('data', '_recorder', '_started')
+
+    def __init__(self, recorder, session_key: str):
+        self._recorder = recorder
+        self._started = time.perf_counter()
+        self.data = {
+            'ts': round(time.time(), 3),
+            'session': recorder.anonymize(session_key),
+            'len': 0,
+            'text': None,
+            'prio': None,
+            'stream': False,
+            'skip': None,
+            'outcome': None,
+            'stages': {},
+        }
+
+    def set_text(self, text: str) -> None:
+        self.data['len'] = len(text)
+        self.data['text'] = self._recorder.anonymize(text)
+
+    def set(self, key: str, value) -> None:
+        self.data[key] = value
+
+    def mark(self, stage: str) -> None:
+        self.data['stages'][stage] = round((time.perf_counter() - self._started) * 1000, 1)
+
+
+class TraceRecorder:
+    """把 TraceRecord 追加写入 JSONL 文件；达到 max_records 条后停止录制。"""
+
+    def __init__(self, path, max_records: int = 100000):
+        self.path = Path(path)
+        self.max_records = max(1, int(max_records))
+        self.records = 0
+        self._key = os.urandom(16)
+        self._file = None
+
+    def anonymize(self, value) -> str:
+        return hashlib.blake2b(str(value).encode('utf-8'), key=self._key, digest_size=8).hexdigest()
+
+    def start(self, session_key: str) -> TraceRecord:
+        return TraceRecord(self, session_key)
+
+    def write(self, record: TraceRecord) -> None:
+        if self.records >= self.max_records:
+            return
+        record.mark('total')
+        data = record.data
+        if data['outcome'] is None:
+            data['outcome'] = 'skip' if data['skip'] else 'text'
+        try:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+            self._file.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n')
+        except Exception as e:
+            logger.warning(f"写入请求轨迹失败: {e}")
+            return
+        self.records += 1
+        if self.records >= self.max_records:
+            logger.info(f"请求轨迹已达到 {self.max_records} 条上限，停止录制: {self.path}")
+            self.close()
+
+    def close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+            self._file = None
+
+
+def load_trace(path) -> list:
+    """读取轨迹文件，按到达时间排序返回记录列表。"""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    records.sort(key=lambda r: r.get('ts', 0))
+    return records
+
+
+def synthetic_text(text_hash: str, length: int) -> str:
+    """由文本哈希与长度确定性地生成替代文本（常用汉字区间），相同输入总是得到相同文本。"""
+    rng = random.Random(text_hash)
+    return ''.join(chr(rng.randint(0x4e00, 0x62ff)) for _ in range(max(1, int(length))))
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class _ReplayContext:
+    """回放用的上下文：限时回复超时后的补发语音只计数，不真正发送。"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, umo, chain) -> None:
+        self.sent += 1
+
+
+class _ReplayEvent:
+    def __init__(self, session: str, priority, decided: bool):
+        self.unified_msg_origin = session
+        self.priority = priority
+        self._extra = {'vits_has_llm': True, 'vits_prob_decided': decided}
+
+    def get_extra(self, key):
+        return self._extra.get(key)
+
+    def set_extra(self, key, value) -> None:
+        self._extra[key] = value
+
+    def get_session_id(self) -> str:
+        return self.unified_msg_origin
+
+
+class _ReplayResult:
+    def __init__(self, chain: list):
+        self.chain = chain
+
+
+async def replay(plugin_cls, config: dict, records: list, speed: float = 1.0, latency: float = 1.0) -> dict:
+    """把轨迹记录按到达间隔送入插件，返回统计信息；plugin_cls 为 VITSPlugin。"""
+    from astrbot.api.message_components import Plain, Record
+    from .tts_scheduler import PRIORITY_GROUP
+
+    workdir = Path(tempfile.mkdtemp(prefix='vits_replay_'))
+
+    class ReplayPlugin(plugin_cls):
+        def _resolve_data_dir(self):
+            # 音频、缓存、会话配置等全部写到临时目录，避免影响线上数据
+            return workdir
+
+        def _classify_priority(self, event):
+            # 使用录制时的优先级（VIP 名单等依赖原始会话标识，回放时无法重新判定）
+            return event.priority if event.priority is not None else PRIORITY_GROUP
+
+    speed = max(0.01, float(speed))
+    config = dict(config)
+    config.update({
+        'tts_backend': 'local',
+        'local_tts_dir': '',
+        'local_tts_latency': max(0.0, float(latency)) / speed,
+        'trace_enabled': False,
+        'audio_cache_shared_dir': '',
+    })
+    context = _ReplayContext()
+    plugin = ReplayPlugin(context, config)
+
+    stats = {'total': len(records), 'replayed': 0, 'content_skipped': 0, 'voice': 0, 'text': 0, 'error': 0}
+    latencies = []
+
+    async def handle(record):
+        event = _ReplayEvent(record.get('session') or '', record.get('prio'), record.get('skip') not in _DECIDED_SKIPS)
+        result = _ReplayResult([Plain(synthetic_text(record.get('text') or '', record.get('len', 1)))])
+        started = time.monotonic()
+        await plugin._convert_to_speech(event, result, event.unified_msg_origin)
+        if any(isinstance(comp, Record) for comp in result.chain):
+            stats['voice'] += 1
+            latencies.append(time.monotonic() - started)
+        elif any(isinstance(comp, Plain) and comp.text.startswith("语音转换失败") for comp in result.chain):
+            stats['error'] += 1
+        else:
+            stats['text'] += 1
+
+    started = time.monotonic()
+    try:
+        base_ts = records[0].get('ts', 0) if records else 0
+        tasks = []
+        for record in records:
+            if record.get('skip') in _CONTENT_SKIPS or not record.get('text'):
+                stats['content_skipped'] += 1
+                continue
+            delay = (record.get('ts', 0) - base_ts) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            stats['replayed'] += 1
+            tasks.append(asyncio.create_task(handle(record)))
+        await asyncio.gather(*tasks)
+        # 等待限时回复转入后台的合成补发完毕
+        while plugin._deferred_voice_tasks:
+            await asyncio.gather(*list(plugin._deferred_voice_tasks), return_exceptions=True)
+        stats['elapsed'] = time.monotonic() - started
+        stats['deferred_sent'] = context.sent
+        stats['p50'] = _percentile(latencies, 0.50)
+        stats['p95'] = _percentile(latencies, 0.95)
+        stats['p99'] = _percentile(latencies, 0.99)
+        stats['max'] = max(latencies) if latencies else 0.0
+        stats['recorded_p95'] = _percentile(
+            [r['stages'].get('synth', 0) / 1000 for r in records if r.get('outcome') == 'voice' and r.get('stages')], 0.95
+        )
+        stats['cache'] = plugin._audio_cache.stats_text()
+        stats['scheduler'] = plugin._scheduler.stats_text()
+        stats['rate_limit'] = plugin._rate_limiter.stats_text() if plugin.rate_limit_enabled else '关闭'
+        return stats
+    finally:
+        await plugin.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def format_replay_stats(stats: dict) -> str:
+    return "\n".join([
+        f"回放完成：共 {stats['total']} 条，回放 {stats['replayed']} 条，按原文跳过 {stats['content_skipped']} 条，"
+        f"用时 {stats['elapsed']:.1f} 秒",
+        f"结果：语音 {stats['voice']}，文字 {stats['text']}，失败 {stats['error']}，超时后补发 {stats['deferred_sent']}",
+        f"语音耗时：p50 {stats['p50'] * 1000:.0f}ms，p95 {stats['p95'] * 1000:.0f}ms，p99 {stats['p99'] * 1000:.0f}ms，"
+        f"最长 {stats['max'] * 1000:.0f}ms（录制时 p95 {stats['recorded_p95'] * 1000:.0f}ms）",
+        f"音频缓存：{stats['cache']}",
+        f"限流：{stats['rate_limit']}",
+        f"调度：{stats['scheduler']}",
+    ])
+
+
+def _parse_override(text: str):
+    key, sep, value = text.partition('=')
+    if not sep or not key.strip():
+        raise argparse.ArgumentTypeError(f"配置覆盖格式应为 key=value: {text}")
+    try:
+        return key.strip(), json.loads(value)
+    except ValueError:
+        return key.strip(), value
+
+
+def main(argv=None):
+    from .batch_tts import DEFAULT_CONFIG_PATH
+
+    parser = argparse.ArgumentParser(description="在本地替身后端上回放 VITS 请求轨迹，比较调度/缓存/并发配置")
+    parser.add_argument('trace', help="trace_enabled 录制的 JSONL 轨迹文件")
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH, help="插件配置文件路径")
+    parser.add_argument('--speed', type=float, default=1.0, help="回放倍速，如 10 表示 10 倍速")
+    parser.add_argument('--latency', type=float, default=1.0, help="替身后端单次合成耗时（秒，1 倍速下）")
+    parser.add_argument('--set', dest='overrides', action='append', type=_parse_override, default=[],
+                        help="覆盖插件配置，可重复，如 --set tts_max_concurrency=2")
+    args = parser.parse_args(argv)
+
+    from .main import VITSPlugin
+
+    config_path = Path(args.config)
+    config = json.loads(config_path.read_text(encoding='utf-8-sig')) if config_path.exists() else {}
+    config.update(dict(args.overrides))
+    records = load_trace(args.trace)
+    stats = asyncio.run(replay(VITSPlugin, config, records, args.speed, args.latency))
+    print(format_replay_stats(stats))
+
+
+if __name__ == '__main__':
+    main()